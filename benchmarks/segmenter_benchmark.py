@@ -0,0 +1,55 @@
+'''
+Copyright 2017 Recruit Institute of Technology
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+     http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+'''
+
+# Throughput benchmark for the segmentation engines.
+# Usage: python benchmarks/segmenter_benchmark.py [text_file]
+
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from koko.segmenter import Segmenter
+
+ROOT = os.path.abspath(os.path.dirname(__file__))
+
+
+def load_text(argv):
+    if len(argv) > 1:
+        with open(argv[1], 'r') as myfile:
+            return myfile.read()
+    with open(os.path.join(ROOT, '..', 'examples', 'cafe.txt'), 'r') as myfile:
+        text = myfile.read()
+    # Repeat the sample document to get a few MB of text.
+    return text * max(1, (4 << 20) // max(1, len(text)))
+
+
+def run(text, engine, repeat=3):
+    best = None
+    for i in range(repeat):
+        start = time.perf_counter()
+        segments = Segmenter.Segment(text, engine=engine)
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    mb = len(text.encode('utf-8')) / float(1 << 20)
+    print('%-12s %8d segments %8.3f s %8.2f MB/s' % (engine, len(segments), best, mb / best))
+
+
+if __name__ == '__main__':
+    text = load_text(sys.argv)
+    for engine in ['characters', 'vectorized']:
+        run(text, engine)
@@ -32,6 +32,18 @@ op.add_option("--output_format",
               action="store", type="string", dest="output_format",
               default="text",
               help="Output format: text or json.")
+op.add_option("--workers",
+              action="store", type="int", dest="workers",
+              default=None,
+              help="Number of worker processes for corpus queries (default: one per core).")
+op.add_option("--aggregation",
+              action="store", type="string", dest="aggregation",
+              default="max",
+              help="Cross-document score aggregation for corpus queries: max, sum or mean.")
+op.add_option("--cache_dir",
+              action="store", type="string", dest="cache_dir",
+              default=None,
+              help="Directory of the cache of tokenized documents (default: no cache).")
 op.add_option("--log_level",
               action="store", type="string", dest="log_level",
               default="error",
@@ -59,7 +71,9 @@ with open(opts.query_file, 'r') as qfile:
 # Process the KOKO query
 
 from koko.query_processor import QueryProcessor
-processor = QueryProcessor(opts.doc_parser)
+processor = QueryProcessor(opts.doc_parser, cache_dir=opts.cache_dir,
+                           max_workers=opts.workers,
+                           corpus_aggregation=opts.aggregation)
 response = processor.ProcessQuery(query)
 
 # Print the results
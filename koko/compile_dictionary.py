@@ -0,0 +1,45 @@
+'''
+Copyright 2017 Recruit Institute of Technology
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+     http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+'''
+
+# Compiles text dictionaries, one entry per line, into compiled dictionaries (see
+# dictionary_file.py). By default, the compiled dictionary of <dir>/<name>[.ext]
+# is <dir>/<name>.kdict, which the dictionary registry prefers to the text one.
+#
+# Usage: python -m koko.compile_dictionary [--weighted] [--output file] dictionary...
+
+from .dictionary_file import EXTENSION, read_text_dictionary, write_compiled_dictionary
+from optparse import OptionParser
+import os
+
+op = OptionParser(usage='%prog [options] dictionary...')
+op.add_option("--weighted",
+              action="store_true", dest="weighted", default=False,
+              help="Lines are 'entry<tab>weight' instead of entries.")
+op.add_option("--output",
+              action="store", type="string", dest="output",
+              help="Compiled dictionary file name, for a single dictionary.")
+
+(opts, args) = op.parse_args()
+if not args:
+    op.error("no dictionary given.")
+if opts.output and len(args) > 1:
+    op.error("--output takes a single dictionary.")
+
+for filename in args:
+    output = opts.output or os.path.splitext(filename)[0] + EXTENSION
+    write_compiled_dictionary(output, read_text_dictionary(filename, opts.weighted),
+                              opts.weighted)
+    print("Compiled %s into %s" % (filename, output))
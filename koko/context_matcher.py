@@ -0,0 +1,90 @@
+'''
+Copyright 2017 Recruit Institute of Technology
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+     http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+'''
+
+import numpy
+
+
+class ContextMatcher:
+    # Token-level Aho-Corasick automaton over a set of n-grams. A single pass over a
+    # token sequence finds every occurrence of every n-gram.
+
+    def __init__(self, ngrams):
+        self.ngrams = []
+        self.ngram_set = set()
+        self.transitions = [{}]
+        self.failure = [0]
+        self.outputs = [[]]
+        for ngram in ngrams:
+            self.AddNgram(tuple(ngram))
+        self.alphabet = set(token for ngram in self.ngrams for token in ngram)
+        self.LinkFailures()
+
+    def AddNgram(self, ngram):
+        if not ngram or ngram in self.ngram_set:
+            return
+        self.ngram_set.add(ngram)
+        state = 0
+        for token in ngram:
+            if token not in self.transitions[state]:
+                self.transitions[state][token] = len(self.transitions)
+                self.transitions.append({})
+                self.failure.append(0)
+                self.outputs.append([])
+            state = self.transitions[state][token]
+        self.outputs[state].append(len(self.ngrams))
+        self.ngrams.append(ngram)
+
+    # Computes the failure links in breadth-first order, and merges the outputs of
+    # every state with the outputs of its failure state.
+    def LinkFailures(self):
+        queue = list(self.transitions[0].values())
+        for state in queue:
+            for token, next_state in self.transitions[state].items():
+                queue.append(next_state)
+                failure = self.failure[state]
+                while failure and token not in self.transitions[failure]:
+                    failure = self.failure[failure]
+                self.failure[next_state] = self.transitions[failure].get(token, 0)
+                self.outputs[next_state] = self.outputs[next_state] + \
+                    self.outputs[self.failure[next_state]]
+
+    # Returns a dictionary mapping every n-gram to the sorted list of the start
+    # positions of its occurrences in tokens. If a DocumentIndex of the tokens is
+    # given, only the positions of tokens that appear in some n-gram are visited.
+    def FindAll(self, tokens, index=None):
+        hits = [[] for ngram in self.ngrams]
+        lengths = [len(ngram) for ngram in self.ngrams]
+        if index is not None:
+            postings = [index.Postings(token) for token in self.alphabet]
+            positions = numpy.sort(numpy.concatenate(postings)).tolist() if postings else []
+        else:
+            positions = range(len(tokens))
+        transitions = self.transitions
+        failure = self.failure
+        outputs = self.outputs
+        state = 0
+        prev = -2
+        for pos in positions:
+            if pos != prev + 1:
+                state = 0  # the skipped tokens are not part of any n-gram
+            prev = pos
+            token = tokens[pos]
+            while state and token not in transitions[state]:
+                state = failure[state]
+            state = transitions[state].get(token, 0)
+            for k in outputs[state]:
+                hits[k].append(pos - lengths[k] + 1)
+        return dict(zip(self.ngrams, hits))
@@ -0,0 +1,167 @@
+'''
+Copyright 2017 Recruit Institute of Technology
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+     http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+'''
+
+###
+# Compiled dictionaries.
+#
+# A compiled dictionary is a sorted string table of the entries of a dictionary,
+# with optional weights. The file holds a header followed by arrays in native byte
+# order, each aligned to 8 bytes:
+#
+#   header   magic, format version, flags, number of entries, length of the entries
+#   offsets  byte offsets of the entries (int64), one more than the entries
+#   weights  weights of the entries (float64), if the dictionary is weighted
+#   entries  UTF-8 entries, concatenated in byte order, without separators
+#
+# Files are memory-mapped when opened, so opening takes constant time, nothing is
+# copied, and the pages are shared by all the processes using the dictionary. An
+# exact lookup is a binary search over the entries.
+#
+# Compiled dictionaries are built from text dictionaries, one entry per line,
+# with compile_dictionary.py.
+###
+
+import mmap
+import numpy
+import os
+import struct
+
+MAGIC = b'KOKODIC\0'
+FORMAT_VERSION = 1
+# magic, version, flags, #entries, length of the entries in bytes
+HEADER = struct.Struct('=8sIIqq')
+WEIGHTED = 1
+# Extension of compiled dictionaries.
+EXTENSION = '.kdict'
+
+
+def aligned(offset):
+    return (offset + 7) & ~7
+
+
+# Returns whether a file is a compiled dictionary.
+def is_compiled_dictionary(filename):
+    with open(filename, 'rb') as myfile:
+        return myfile.read(len(MAGIC)) == MAGIC
+
+
+# Reads the (entry, weight) pairs of a text dictionary, one entry per line. With
+# weighted, lines are 'entry<tab>weight'; otherwise every weight is 1.
+def read_text_dictionary(filename, weighted=False):
+    with open(filename) as myfile:
+        for line in myfile:
+            line = line.rstrip()
+            if weighted:
+                entry, weight = line.rsplit('\t', 1)
+                yield entry, float(weight)
+            else:
+                yield line, 1
+
+
+# Writes the compiled dictionary of (entry, weight) pairs. Of duplicate entries, the
+# last one is kept. The file is written to a temporary file first, so readers never
+# see a partial dictionary.
+def write_compiled_dictionary(filename, entries, weighted=False):
+    weights = {}
+    for entry, weight in entries:
+        weights[entry.encode('utf-8')] = weight
+    keys = sorted(weights)
+    offsets = numpy.zeros(len(keys) + 1, dtype=numpy.int64)
+    numpy.cumsum(numpy.fromiter(map(len, keys), dtype=numpy.int64, count=len(keys)),
+                 out=offsets[1:])
+    arrays = [offsets.tobytes()]
+    if weighted:
+        arrays.append(numpy.array([weights[key] for key in keys],
+                                  dtype=numpy.float64).tobytes())
+    arrays.append(b''.join(keys))
+    temp_path = '%s.%d.tmp' % (filename, os.getpid())
+    with open(temp_path, 'wb') as myfile:
+        myfile.write(HEADER.pack(MAGIC, FORMAT_VERSION, WEIGHTED if weighted else 0,
+                                 len(keys), int(offsets[-1])))
+        offset = HEADER.size
+        for data in arrays:
+            myfile.write(b'\0' * (aligned(offset) - offset))
+            myfile.write(data)
+            offset = aligned(offset) + len(data)
+    os.replace(temp_path, filename)
+
+
+class CompiledDictionary:
+    # Read-only mapping from the entries of a compiled dictionary to their weights,
+    # 1 for the entries of unweighted dictionaries. Iteration is in byte order.
+
+    def __init__(self, filename):
+        with open(filename, 'rb') as myfile:
+            if os.fstat(myfile.fileno()).st_size < HEADER.size:
+                raise ValueError('Not a compiled dictionary: %s' % filename)
+            self.buffer = mmap.mmap(myfile.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, version, flags, self.size, length = HEADER.unpack_from(self.buffer)
+        if magic != MAGIC or version != FORMAT_VERSION:
+            raise ValueError('Not a compiled dictionary: %s' % filename)
+        view = memoryview(self.buffer)
+        offset = aligned(HEADER.size)
+        end = offset + 8 * (self.size + 1)
+        self.offsets = view[offset:end].cast('q')
+        self.weights = None
+        if flags & WEIGHTED:
+            offset = aligned(end)
+            end = offset + 8 * self.size
+            self.weights = view[offset:end].cast('d')
+        self.start = aligned(end)
+        if self.start + length > len(self.buffer):
+            raise ValueError('Truncated compiled dictionary: %s' % filename)
+
+    def __len__(self):
+        return self.size
+
+    # Returns the bytes of the i-th entry.
+    def Entry(self, i):
+        return self.buffer[self.start + self.offsets[i]:self.start + self.offsets[i + 1]]
+
+    # Returns the index of an entry, or -1 if it is not in the dictionary.
+    def Find(self, name):
+        key = name.encode('utf-8')
+        buffer = self.buffer
+        offsets = self.offsets
+        start = self.start
+        lo = 0
+        hi = self.size
+        while lo < hi:
+            mid = (lo + hi) >> 1
+            if buffer[start + offsets[mid]:start + offsets[mid + 1]] < key:
+                lo = mid + 1
+            else:
+                hi = mid
+        return lo if lo < self.size and self.Entry(lo) == key else -1
+
+    def Weight(self, i):
+        return self.weights[i] if self.weights is not None else 1
+
+    def get(self, name, default=None):
+        i = self.Find(name)
+        return self.Weight(i) if i >= 0 else default
+
+    def __getitem__(self, name):
+        i = self.Find(name)
+        if i < 0:
+            raise KeyError(name)
+        return self.Weight(i)
+
+    def __contains__(self, name):
+        return self.Find(name) >= 0
+
+    def __iter__(self):
+        return (self.Entry(i).decode('utf-8') for i in range(self.size))
@@ -0,0 +1,141 @@
+'''
+Copyright 2017 Recruit Institute of Technology
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+     http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+'''
+
+###
+# Persistent cache of tokenized KokoDocuments.
+#
+# A document is stored in <cache_dir>/kokoDocument.<md5>, where md5 is the hash of
+# the document content. The file holds a header followed by arrays in native byte
+# order, each aligned to 8 bytes:
+#
+#   header    magic, format version, offset unit, text length and array lengths
+#   segments  starts (int64), ends (int64), rows (int32), cols (int32), flags (int8)
+#   sents     starts (int64), ends (int64)
+#   ents      starts (int64), ends (int64)
+#
+# Offsets are character offsets for str documents and byte offsets for MappedText
+# documents; the offset unit is part of the header so the two are never mixed up.
+# Cache files are memory-mapped when loaded, so the arrays are not copied.
+###
+
+import hashlib
+import logging
+import mmap
+import os
+import struct
+from .koko_document import KokoDocument
+from .segmenter import MappedText, SegmentStore, SpanList
+
+logger = logging.getLogger()
+
+MAGIC = b'KOKODOC\0'
+# Bump whenever the segmentation, sentence splitting or entity heuristics change.
+FORMAT_VERSION = 1
+# magic, version, offset unit, text length, #segments, #sents, #ents
+HEADER = struct.Struct('=8sIIqqqq')
+OFFSETS_IN_CHARS = 0
+OFFSETS_IN_BYTES = 1
+SEGMENT_COLUMNS = [('starts', 'q'), ('ends', 'q'), ('rows', 'i'), ('cols', 'i'),
+                   ('flags', 'b')]
+
+
+def aligned(offset):
+    return (offset + 7) & ~7
+
+
+class DocumentCache:
+
+    def __init__(self, cache_dir='cache'):
+        self.cache_dir = cache_dir
+
+    def ContentHash(self, text):
+        if isinstance(text, MappedText):
+            return hashlib.md5(text.buffer).hexdigest()
+        return hashlib.md5(text.encode('utf-8')).hexdigest()
+
+    def Path(self, md5):
+        return os.path.join(self.cache_dir, 'kokoDocument.' + md5)
+
+    def OffsetUnit(self, text):
+        return OFFSETS_IN_BYTES if isinstance(text, MappedText) else OFFSETS_IN_CHARS
+
+    # Returns the KokoDocument for text, loading it from the cache if it is present,
+    # and analyzing and caching it otherwise.
+    def GetDocument(self, text):
+        md5 = self.ContentHash(text)
+        doc = self.Load(text, md5)
+        if doc is None:
+            doc = KokoDocument(text)
+            try:
+                self.Save(doc, md5)
+            except OSError as error:
+                logger.warning("Couldn't cache document: %s" % error)
+        return doc
+
+    # Returns the cached document for text, or None if there is no valid cache entry.
+    def Load(self, text, md5=None):
+        path = self.Path(md5 or self.ContentHash(text))
+        if not os.path.exists(path):
+            return None
+        with open(path, 'rb') as myfile:
+            if os.fstat(myfile.fileno()).st_size < HEADER.size:
+                return None
+            buffer = mmap.mmap(myfile.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, version, unit, text_length, num_segments, num_sents, num_ents = \
+            HEADER.unpack_from(buffer)
+        if magic != MAGIC or version != FORMAT_VERSION or \
+           unit != self.OffsetUnit(text) or text_length != len(text):
+            logger.info("Ignoring stale document cache %s" % path)
+            return None
+        columns = SEGMENT_COLUMNS + [('', 'q')] * 4
+        lengths = [num_segments] * len(SEGMENT_COLUMNS) + [num_sents] * 2 + [num_ents] * 2
+        view = memoryview(buffer)
+        offset = aligned(HEADER.size)
+        arrays = []
+        for (name, typecode), length in zip(columns, lengths):
+            end = offset + length * struct.calcsize(typecode)
+            if end > len(buffer):
+                return None
+            arrays.append(view[offset:end].cast(typecode))
+            offset = aligned(end)
+        segments = SegmentStore(text)
+        for (name, typecode), column in zip(SEGMENT_COLUMNS, arrays):
+            setattr(segments, name, column)
+        n = len(SEGMENT_COLUMNS)
+        return KokoDocument(text, segments, sents=(arrays[n], arrays[n + 1]),
+                            ents=(arrays[n + 2], arrays[n + 3]))
+
+    def Save(self, doc, md5=None):
+        if not isinstance(doc.sents, SpanList) or not isinstance(doc.ents, SpanList):
+            return
+        path = self.Path(md5 or self.ContentHash(doc.text))
+        if not os.path.exists(self.cache_dir):
+            os.makedirs(self.cache_dir)
+        arrays = [getattr(doc.segments, name) for name, typecode in SEGMENT_COLUMNS]
+        arrays += [doc.sents.starts, doc.sents.ends, doc.ents.starts, doc.ents.ends]
+        # Write to a temporary file first, so readers never see a partial entry.
+        temp_path = '%s.%d.tmp' % (path, os.getpid())
+        with open(temp_path, 'wb') as myfile:
+            myfile.write(HEADER.pack(MAGIC, FORMAT_VERSION, self.OffsetUnit(doc.text),
+                                     len(doc.text), len(doc.segments),
+                                     len(doc.sents), len(doc.ents)))
+            offset = HEADER.size
+            for column in arrays:
+                myfile.write(b'\0' * (aligned(offset) - offset))
+                data = column.tobytes()
+                myfile.write(data)
+                offset = aligned(offset) + len(data)
+        os.replace(temp_path, path)
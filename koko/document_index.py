@@ -0,0 +1,153 @@
+'''
+Copyright 2017 Recruit Institute of Technology
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+     http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+'''
+
+from bisect import bisect_left, bisect_right
+import numpy
+
+empty_postings = numpy.zeros(0, dtype=numpy.int64)
+
+
+# Returns the distance to the nearest occurrence of an n-gram of length n, given the
+# sorted list of the start positions of its occurrences, following the convention of
+# Matcher.MatchesNgram: with direction = 1 the occurrence must start at pos + distance,
+# with direction = -1 it must end at pos - distance. Returns -1 if no occurrence is
+# within window tokens.
+def nearest_occurrence(starts, n, pos, direction=1, window=0):
+    if window < 0:
+        return -1
+    if n == 0:
+        return 0
+    if direction > 0:
+        i = bisect_left(starts, pos)
+        if i < len(starts) and starts[i] - pos <= window:
+            return starts[i] - pos
+    else:
+        i = bisect_right(starts, pos - n) - 1
+        if i >= 0 and pos - n - starts[i] <= window:
+            return pos - n - starts[i]
+    return -1
+
+
+# Returns the batch version of nearest_occurrence: an array with the distance to the
+# nearest occurrence for every position of the positions array.
+def nearest_occurrences(starts, n, positions, direction=1, window=0):
+    positions = numpy.asarray(positions, dtype=numpy.int64)
+    distances = numpy.full(len(positions), -1, dtype=numpy.int64)
+    if window < 0:
+        return distances
+    if n == 0:
+        distances[:] = 0
+        return distances
+    starts = numpy.asarray(starts, dtype=numpy.int64)
+    if direction > 0:
+        i = numpy.searchsorted(starts, positions, side='left')
+        found = i < len(starts)
+        d = starts[i[found]] - positions[found]
+    else:
+        i = numpy.searchsorted(starts, positions - n, side='right') - 1
+        found = i >= 0
+        d = positions[found] - n - starts[i[found]]
+    distances[found] = numpy.where(d <= window, d, -1)
+    return distances
+
+
+# Returns a boolean mask over the positions of the token_ids array, true where the
+# ngram of token ids starts, by AND-reducing the shifted equality of every ngram
+# token with the array.
+def hit_mask(token_ids, ngram):
+    n, m = len(token_ids), len(ngram)
+    mask = numpy.zeros(n, dtype=bool)
+    if m == 0:
+        mask[:] = True
+    elif m <= n:
+        hits = mask[:n - m + 1]
+        numpy.equal(token_ids[:n - m + 1], ngram[0], out=hits)
+        for j in range(1, m):
+            hits &= token_ids[j:n - m + 1 + j] == ngram[j]
+    return mask
+
+
+class DocumentIndex:
+    # Inverted positional index mapping every token id of a document to the sorted
+    # array of its positions.
+
+    def __init__(self, tokens):
+        self.tokens = tokens
+        self.postings = {}
+        self.occurrences = {}
+        self.token_ids = token_ids = numpy.asarray(tokens, dtype=numpy.int64)
+        # Group positions by token; a stable sort keeps each group sorted.
+        positions = numpy.argsort(token_ids, kind='stable')
+        sorted_ids = token_ids[positions]
+        bounds = numpy.flatnonzero(sorted_ids[1:] != sorted_ids[:-1]) + 1
+        starts = numpy.concatenate(([0], bounds)).tolist() if len(tokens) else []
+        ends = bounds.tolist() + [len(tokens)]
+        for start, end in zip(starts, ends):
+            self.postings[int(sorted_ids[start])] = positions[start:end]
+
+    def Postings(self, token):
+        return self.postings.get(token, empty_postings)
+
+    # Returns the hit mask of an ngram of token ids (see hit_mask).
+    def HitMask(self, ngram):
+        return hit_mask(self.token_ids, ngram)
+
+    # Returns the sorted list of the start positions of all occurrences of an
+    # ngram of token ids. Candidates come from the postings of the rarest ngram
+    # token and are verified against the token array; when that token is common,
+    # the hit mask of the whole document is cheaper. Results are cached per ngram.
+    def FindAllOccurrences(self, ngram):
+        key = tuple(ngram)
+        if key in self.occurrences:
+            return self.occurrences[key]
+        n = len(ngram)
+        if n == 0:
+            starts = list(range(len(self.tokens) + 1))
+        else:
+            rarest = min(range(n), key=lambda j: len(self.Postings(ngram[j])))
+            candidates = self.Postings(ngram[rarest])
+            if n > 1 and len(candidates) * 8 > len(self.tokens):
+                starts = numpy.flatnonzero(self.HitMask(ngram)).tolist()
+            else:
+                candidates = candidates - rarest
+                candidates = candidates[(candidates >= 0) &
+                                        (candidates + n <= len(self.tokens))]
+                for j in range(n):
+                    if j != rarest:
+                        candidates = candidates[self.token_ids[candidates + j] == ngram[j]]
+                starts = candidates.tolist()
+        self.occurrences[key] = starts
+        return starts
+
+    # Returns (start, end) of the first occurrence of an ngram of token ids, or (0, 0).
+    def FindNgram(self, ngram):
+        starts = self.FindAllOccurrences(ngram)
+        if not starts:
+            return 0, 0
+        return starts[0], starts[0] + len(ngram)
+
+    # Returns the distance to the nearest occurrence of an ngram of token ids within
+    # window tokens of pos, or -1 (see nearest_occurrence).
+    def NearestOccurrence(self, pos, ngram, direction=1, window=0):
+        return nearest_occurrence(self.FindAllOccurrences(ngram), len(ngram), pos,
+                                  direction, window)
+
+    # Returns the array of the distances to the nearest occurrence of an ngram of
+    # token ids within window tokens of each of the positions (see
+    # nearest_occurrences).
+    def NearestOccurrences(self, positions, ngram, direction=1, window=0):
+        return nearest_occurrences(self.FindAllOccurrences(ngram), len(ngram), positions,
+                                   direction, window)
@@ -14,11 +14,24 @@ See the License for the specific language governing permissions and
 limitations under the License.
 '''
 
+from .context_matcher import ContextMatcher
+from .dictionary_file import EXTENSION, CompiledDictionary, is_compiled_dictionary
+from .segmenter import SegmentedDocument
+from .vocabulary import vocabulary
+import numpy
 import os
 
+# Directory of the dictionaries shipped with koko.
+dict_dir = os.path.join(os.path.dirname(__file__), 'dict')
+
 class DictionaryEntityClassifier:
+    # Classifies the entries of a text dictionary, one entry per line, or of a
+    # compiled dictionary (see dictionary_file.py), which is memory-mapped instead
+    # of loaded.
+
     def __init__(self, filename):
         self.dictionary = {}
+        self.entry_matcher = None
         self.load_dictionary(filename)
 
     def load_dictionary(self, filename):
@@ -27,6 +40,9 @@ class DictionaryEntityClassifier:
         if not os.path.exists(filename):
             print('File not found: %s' % filename)
             return
+        if is_compiled_dictionary(filename):
+            self.dictionary = CompiledDictionary(filename)
+            return
 
         file = open(filename)
         for line in file.readlines():
@@ -34,7 +50,77 @@ class DictionaryEntityClassifier:
         file.close()
 
     def is_entity(self, name):
-        if name in self.dictionary:
-            return self.dictionary[name]
-        else:
-            return 0.0
+        return self.dictionary.get(name, 0.0)
+
+    # Returns the automaton of the token ids of the entries, built on first use.
+    # Entries are segmented like documents, and token ids are normalized, so the
+    # automaton matches entries up to case and accents.
+    def EntryMatcher(self):
+        if self.entry_matcher is None:
+            self.entry_matcher = ContextMatcher(self.EntryTokenIds())
+        return self.entry_matcher
+
+    # Returns the lists of the token ids of the entries. All the entries are
+    # segmented at once, one per row.
+    def EntryTokenIds(self):
+        doc = SegmentedDocument('\n'.join(self.dictionary))
+        token_ids = vocabulary.TokenIds(doc.TokenTexts())
+        bounds = numpy.flatnonzero(numpy.diff(doc.TokenRows())) + 1
+        return [ids.tolist() for ids in numpy.split(token_ids, bounds) if len(ids)]
+
+    # Returns the sorted (start, end) token positions of the occurrences of the
+    # entries in the token ids of a document, found in a single pass. If a
+    # DocumentIndex of the tokens is given, only the positions of tokens that appear
+    # in some entry are visited.
+    def FindEntries(self, tokens, index=None):
+        hits = self.EntryMatcher().FindAll(tokens, index)
+        return sorted((start, start + len(ngram))
+                      for ngram, starts in hits.items() for start in starts)
+
+
+class DictionaryRegistry:
+    # Process-wide registry of the dictionaries of a directory. The dictionary of a
+    # type name is the file named after it, with or without extension; a compiled
+    # dictionary (<name>.kdict) is preferred to the text one. It is loaded on first
+    # use, and loaded again only when the modification time of the file changes.
+
+    def __init__(self, directory):
+        self.directory = directory
+        self.classifiers = {}  # type name -> (path, mtime, classifier)
+
+    # Returns whether a type name names a file of the directory. Type names come from
+    # queries, so they must not reach files elsewhere.
+    def IsValidName(self, type_name):
+        separators = [sep for sep in (os.sep, os.altsep) if sep]
+        return bool(type_name) and not os.path.isabs(type_name) and \
+            '..' not in type_name and not any(sep in type_name for sep in separators)
+
+    # Returns the path of the dictionary of a type name, or None if there is none.
+    def Path(self, type_name):
+        if not self.IsValidName(type_name):
+            return None
+        for path in [os.path.join(self.directory, type_name + EXTENSION),
+                     os.path.join(self.directory, type_name)]:
+            if os.path.isfile(path):
+                return path
+        if os.path.isdir(self.directory):
+            for name in sorted(os.listdir(self.directory)):
+                if os.path.splitext(name)[0] == type_name:
+                    return os.path.join(self.directory, name)
+        return None
+
+    # Returns the classifier of a type name, or None if there is no dictionary.
+    def Get(self, type_name):
+        entry = self.classifiers.get(type_name)
+        path = entry[0] if entry and os.path.isfile(entry[0]) else self.Path(type_name)
+        if path is None:
+            self.classifiers.pop(type_name, None)
+            return None
+        mtime = os.stat(path).st_mtime_ns
+        if entry is None or entry[0] != path or entry[1] != mtime:
+            entry = (path, mtime, DictionaryEntityClassifier(path))
+            self.classifiers[type_name] = entry
+        return entry[2]
+
+# The registry of the dictionaries shipped with koko, shared by all scorers.
+dictionary_registry = DictionaryRegistry(dict_dir)
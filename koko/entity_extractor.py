@@ -14,54 +14,274 @@ See the License for the specific language governing permissions and
 limitations under the License.
 '''
 
+from .entity_classifier import dictionary_registry
 from .matcher import Matcher, Ngram
 from .parser import Parser
+from .score_matrix import ScoreMatrix
 from .scorer import Scorer
+from .semantic_scorer import SemanticScorer
+from .segmenter import punctuation
+from .sentence_table import get_sentence_table
+from .vocabulary import TokenIdSet, vocabulary
 
+from itertools import islice
+import numpy
 import sys
 
 class Entity:
 
+    __slots__ = ('span', 'mentions', 'score', 'scores', 'compact_name')
+
     def __init__(self, span):
         self.span = span
         self.mentions = []
         self.score = 0.0
         self.scores = []
-        self.name = span.text.replace('\n', ' ')
+        self.compact_name = None
+
+    # The name is only materialized for the entities that are actually read, or
+    # when they are stripped.
+    @property
+    def name(self):
+        if self.compact_name is not None:
+            return self.compact_name
+        return self.span.text.replace('\n', ' ')
 
+    # Keeps only the name and the scores, dropping all references to the document.
     def strip(self):
+        self.compact_name = self.name
+        del self.span
         del self.scores
         for mention in self.mentions:
             mention.strip()
 
+    # The state of an entity, as pickled and serialized (e.g. by jsonpickle), holds
+    # its name rather than compact_name.
+    def __getstate__(self):
+        state = {'name': self.name}
+        for attr in ('span', 'mentions', 'score', 'scores'):
+            if hasattr(self, attr):
+                state[attr] = getattr(self, attr)
+        return state
+
+    def __setstate__(self, state):
+        self.compact_name = None
+        for attr, value in state.items():
+            setattr(self, 'compact_name' if attr == 'name' else attr, value)
+
 class Mention:
+    # The predicate scores of a mention are either its own list, or a row of a score
+    # table shared by the mentions scored together (see Scorer.ScoreMentions).
+
+    __slots__ = ('span', 'sentence_index', 'score', 'score_table', 'row', 'debug')
 
     def __init__(self, span, sentence_index=-1):
         self.span = span
         self.sentence_index = sentence_index
         self.score = 0.0
-        self.scores = []
+        self.score_table = []
+        self.row = -1
         self.debug = ''
 
+    @property
+    def scores(self):
+        if self.row < 0:
+            return self.score_table
+        return self.score_table[self.row].tolist()
+
+    @scores.setter
+    def scores(self, scores):
+        self.score_table = scores
+        self.row = -1
+
     def strip(self):
         del self.span
         del self.sentence_index
-        del self.scores
+        del self.score_table
+        del self.row
         del self.debug
 
+    # The state of a mention holds its scores rather than its row of the score table.
+    def __getstate__(self):
+        state = {}
+        for attr in ('span', 'sentence_index', 'score', 'scores', 'debug'):
+            if hasattr(self, attr):
+                state[attr] = getattr(self, attr)
+        return state
+
+    def __setstate__(self, state):
+        for attr, value in state.items():
+            setattr(self, attr, value)
+
+
+class EntityList(list):
+    # The entities of a query, with the ScoreMatrix of the mentions they were ranked
+    # from, so that they can be ranked again with other weights, threshold or limit
+    # without scoring the mentions again. mentions[m] is the mention of row m of the
+    # matrix, or None for compact results, which cannot be ranked again. Neither can
+    # partial results, of a query with a limit that stopped scoring mentions early
+    # (see QueryResults). Mention scores are not updated when ranking again.
+
+    def __init__(self, entities, score_matrix, mentions, threshold=0, limit=0,
+                 partial=False):
+        list.__init__(self, entities)
+        self.score_matrix = score_matrix
+        self.mentions = mentions
+        self.threshold = threshold
+        self.limit = limit
+        self.partial = partial
+
+    # Returns the entities for the given predicate weights, threshold and limit, which
+    # default to those of the query.
+    def Rescore(self, weights=None, threshold=None, limit=None):
+        assert self.mentions is not None, 'compact results cannot be ranked again'
+        assert not self.partial, 'partial results cannot be ranked again'
+        threshold = self.threshold if threshold is None else threshold
+        limit = self.limit if limit is None else limit
+        return self.RankEntities(weights, threshold, limit)
+
+    # Returns the entities of the rows of the matrix for the given predicate weights
+    # (None for those of the query), threshold and limit.
+    def RankEntities(self, weights, threshold, limit):
+        matrix = self.score_matrix
+        ids, totals, sums = matrix.Rank(weights, threshold, limit)
+        selected = numpy.zeros(matrix.num_entities, dtype=bool)
+        selected[ids] = True
+        rows = numpy.flatnonzero(matrix.Positive(weights))
+        rows = rows[selected[matrix.entity_ids[rows]]]
+        entities = {}
+        for row, eid in zip(rows.tolist(), matrix.entity_ids[rows].tolist()):
+            mention = self.mentions[row]
+            if eid not in entities:
+                entities[eid] = Entity(mention.span)
+            entities[eid].mentions.append(mention)
+        totals = totals.tolist()
+        for eid in ids.tolist():
+            entities[eid].score = totals[eid] if totals[eid] <= 1 else 1
+            entities[eid].scores = sums[eid].tolist()
+        return EntityList([entities[eid] for eid in ids.tolist()], matrix,
+                          self.mentions, threshold, limit, self.partial)
+
+
+class EntityUpdate:
+    # An update of a streamed query (see EntityExtractor.IterTopEntities): the
+    # provisional entities whose score changed since the previous update, or, when
+    # final is set, the entities of the query as returned by TopEntities.
+
+    __slots__ = ('entities', 'final')
+
+    def __init__(self, entities, final=False):
+        self.entities = entities
+        self.final = final
+
+
+class QueryResults:
+    # The ScoreMatrix rows, entity ids and mentions kept for a query while its
+    # mentions are scored in batches.
+    # With a query limit k, only the top k entities are selected. If no predicate has
+    # a negative weight, entity scores only grow with mentions: mentions come in
+    # start order, so once the first k entities, which win ties, saturate at 1, the
+    # remaining mentions cannot change the top k and do not need to be scored.
+    # Entity mentions and scores are then partial. Saturation is checked once at
+    # least as many mentions were scored since the last check as there were rows at
+    # the last check, so that checking stays linear in the number of mentions.
+    # With provisional, the entities whose score changed are collected in updates
+    # at each check.
+
+    def __init__(self, parser, provisional=False):
+        self.parser = parser
+        self.provisional = provisional
+        self.weights = [predicate.weight for predicate in parser.predicates]
+        self.limit = parser.limit
+        self.saturate = self.limit > 0 and parser.threshold <= 1 and \
+            all(weight >= 0 for weight in self.weights)
+        self.saturated = False
+        self.ent_ids = {}  # token ids of an entity -> entity id
+        self.matrices = []
+        self.mentions = []  # the mentions of the rows of the matrices
+        self.unchecked = 0  # mentions scored since the last check
+        self.checked = 0  # rows at the last check
+        self.reported = numpy.zeros(0)  # entity scores in the provisional updates
+        self.updates = []  # provisional entities not yielded yet
+
+    # Adds the rows of the mentions kept from a batch of num_scored mentions, where
+    # matrix is the ScoreMatrix of the batch restricted to them.
+    def Add(self, matrix, mentions, num_scored):
+        self.matrices.append(matrix)
+        self.mentions += mentions
+        self.unchecked += num_scored
+        if (self.saturate or self.provisional) and self.unchecked >= self.checked:
+            self.unchecked = 0
+            self.checked = len(self.mentions)
+            self.matrices = [self.Matrix()]
+            if self.saturate:
+                self.saturated = self.matrices[0].LeadersSaturated(self.limit)
+            if self.provisional:
+                self.updates += self.ChangedEntities(self.matrices[0])
+
+    # Returns the entities passing the threshold whose score changed since the last
+    # update, by decreasing score. They have no mentions.
+    def ChangedEntities(self, matrix):
+        ids, totals, sums = matrix.Rank(threshold=self.parser.threshold)
+        reported = numpy.full(matrix.num_entities, numpy.nan)
+        reported[:len(self.reported)] = self.reported
+        ids = ids[totals[ids] != reported[ids]]
+        reported[ids] = totals[ids]
+        self.reported = reported
+        first = matrix.FirstPositive()
+        entities = []
+        for eid, total in zip(ids.tolist(), totals[ids].tolist()):
+            entity = Entity(self.mentions[first[eid]].span)
+            entity.score = total if total <= 1 else 1
+            entity.scores = sums[eid].tolist()
+            entities.append(entity)
+        return entities
+
+    def Matrix(self):
+        return ScoreMatrix.Concatenate(self.matrices, self.weights, len(self.ent_ids))
+
+    # Returns the entities of the query. They are partial if scoring stopped when the
+    # leaders saturated.
+    def Entities(self):
+        return EntityList([], self.Matrix(), self.mentions, self.parser.threshold,
+                          self.limit, self.saturated).RankEntities(
+                              None, self.parser.threshold, self.limit)
+
 
 class EntityExtractor:
 
-    def __init__(self, doc, testing=False):
+    # Number of mentions scored at a time.
+    mention_batch_size = 1 << 12
+    # Number of start positions of the Ngrams candidates generated at a time.
+    ngram_block_size = 1 << 14
+
+    # skip_punctuation: reject Ngrams candidates starting or ending with punctuation
+    # context_candidates: only generate the candidates near hits of the query
+    #                     contexts, when that does not change the results
+    # compact: strip the returned entities of their spans and mention details
+    # dictionaries: the DictionaryRegistry of the Dict(name) types and dict
+    #               predicates, the koko dictionaries by default
+    # The analysis of the document (token ids, indexes, sentences, the spans of each
+    # type and sentence decompositions) is done once, on demand, and shared by all
+    # the queries. Dictionaries are shared by the whole process (see
+    # DictionaryRegistry).
+    def __init__(self, doc, testing=False, skip_punctuation=False,
+                 context_candidates=False, compact=False, dictionaries=None):
         self.doc = doc
         assert self.doc.is_parsed
         self.error_msg = None
         self.testing = testing
+        self.skip_punctuation = skip_punctuation
+        self.context_candidates = context_candidates
+        self.compact = compact
+        self.dictionaries = dictionaries if dictionaries is not None else \
+            dictionary_registry
         self.matcher = Matcher(self.doc)
-        #print("Collecting set of document words")
-        self.doc_words = set()
-        for i in range(len(doc)):
-            self.doc_words.add(doc[i].text.lower())
+        self.doc_words = TokenIdSet(self.matcher.token_ids)
+        self.sentence_table = get_sentence_table(self.doc)
+        self.punctuation_mask = None
+        self.sentence_spans = {}  # etype -> spans within a sentence, sentence indices
+        self.semantic_scorers = {}  # sentence decomposer server url -> SemanticScorer
 
     def TopEntities(self, query):
         #print("Parse the query")
@@ -70,32 +290,173 @@ class EntityExtractor:
             self.error_msg = parser.error_msg
             return []
         return self.TopEntitiesForParsedQuery(parser)
+
+    # Returns the k top entities of the query, as with 'limit k'.
+    def TopK(self, query, k):
+        parser = Parser(query, self.doc_words, testing=self.testing)
+        if not parser.is_parsed:
+            self.error_msg = parser.error_msg
+            return []
+        parser.limit = k
+        return self.TopEntitiesForParsedQuery(parser)
         
     def TopEntitiesForParsedQuery(self, parser):
         self.query_debug = parser.toString()
-        spans = self.GetSpans(parser.etype)
         #print("GetMentionsFromSpans")
         #all_mentions = self.GetMentionsFromSpans(spans)
-        all_mentions = self.JoinSpansAndSentences(spans)
+        windows = self.GetContextWindows(parser) if self.context_candidates else None
+        all_mentions = self.IterMentions(parser.etype, windows)
         return self.TopEntitiesFromMentions(parser, all_mentions)
         
+    # Streaming version of TopEntities: yields EntityUpdates with the provisional
+    # entities whose score changed as mentions are scored, and finally the ranked
+    # entities. For a query that cannot be parsed, only yields an empty final update.
+    def IterTopEntities(self, query):
+        parser = Parser(query, self.doc_words, testing=self.testing)
+        if not parser.is_parsed:
+            self.error_msg = parser.error_msg
+            yield EntityUpdate([], final=True)
+            return
+        yield from self.IterTopEntitiesForParsedQuery(parser)
+
+    def IterTopEntitiesForParsedQuery(self, parser):
+        self.query_debug = parser.toString()
+        windows = self.GetContextWindows(parser) if self.context_candidates else None
+        all_mentions = self.IterMentions(parser.etype, windows)
+        yield from self.IterEntityUpdates(parser, all_mentions, provisional=True)
+
+    # Returns the entities of each query, or [] for the queries that cannot be
+    # parsed, setting error_msg. Queries are grouped by etype, so that the candidate
+    # spans of a group are generated once, and each distinct predicate of a group is
+    # evaluated once per mention (see TopEntitiesForParsedQueries).
+    def TopEntitiesBatch(self, queries):
+        results = [[] for query in queries]
+        groups = {}  # (etype, sentence decomposer server url) -> query indices
+        parsers = []
+        for i, query in enumerate(queries):
+            parser = Parser(query, self.doc_words, testing=self.testing)
+            parsers.append(parser)
+            if not parser.is_parsed:
+                self.error_msg = parser.error_msg
+                continue
+            key = (parser.etype, parser.sentence_decomposer_server_url)
+            groups.setdefault(key, []).append(i)
+        for indices in groups.values():
+            entities = self.TopEntitiesForParsedQueries([parsers[i] for i in indices])
+            for i, query_entities in zip(indices, entities):
+                results[i] = query_entities
+        return results
+
+    # Returns the entities of each query, for queries with the same etype and
+    # sentence decomposer server. The candidates are the union of those of the
+    # queries.
+    def TopEntitiesForParsedQueries(self, parsers):
+        windows = None
+        if self.context_candidates:
+            query_windows = [self.GetContextWindows(parser) for parser in parsers]
+            if all(w is not None for w in query_windows):
+                windows = tuple(numpy.logical_or.reduce([w[i] for w in query_windows])
+                                for i in range(2))
+        all_mentions = self.IterMentions(parsers[0].etype, windows)
+        return self.TopEntitiesFromMentionsBatch(parsers, all_mentions)
+
+    # Mentions can be any iterable; they are scored in batches, and only the rows of
+    # the mentions that can score above 0 with some weights are kept in the
+    # ScoreMatrix the entities are ranked from (see EntityList and QueryResults).
     def TopEntitiesFromMentions(self, parser, mentions):
-        scorer = Scorer(self.doc, self.matcher,
-                        parser.predicates,
-                        parser.excluding_predicates,
-                        parser.sentence_decomposer_server_url)
-        #print("ScoreMentions")
-        scorer.ScoreMentions(mentions)
-        #print("FilterMentions")
-        filtered_mentions = self.FilterMentions(mentions)
-        #print("ClusterMentions")
-        entities = self.ClusterMentions(filtered_mentions)
-        #print("ScoreEntities")
-        scorer.ScoreEntities(entities)
-        filtered_entities = self.FilterEntities(entities, parser.threshold)
-        #self.StripEntities(filtered_entities)
-        return sorted(filtered_entities, key=lambda x: x.score, reverse=True)
+        for update in self.IterEntityUpdates(parser, mentions):
+            pass
+        return update.entities
 
+    # Yields the provisional updates of the query as mentions are scored, if
+    # provisional is set, and then the final update with the ranked entities.
+    def IterEntityUpdates(self, parser, mentions, provisional=False):
+        scorer = self.GetScorer(parser)
+        results = QueryResults(parser, provisional)
+        mentions = iter(mentions)
+        while not results.saturated:
+            batch = list(islice(mentions, self.mention_batch_size))
+            if not batch:
+                break
+            #print("ScoreMentions")
+            matrix = scorer.ScoreMentions(batch)
+            rows = numpy.flatnonzero(matrix.Retained())
+            kept = [batch[k] for k in rows.tolist()]
+            #print("GetEntityIds")
+            results.Add(matrix.Select(rows, self.GetEntityIds(kept, results.ent_ids),
+                                      len(results.ent_ids)), kept, len(batch))
+            if results.updates:
+                if self.compact:
+                    self.StripEntities(results.updates)
+                yield EntityUpdate(results.updates)
+                results.updates = []
+        #print("GetEntities")
+        yield EntityUpdate(self.GetEntities(results), final=True)
+
+    # Scores the mentions for several queries, evaluating each distinct predicate of
+    # the queries, including excluding predicates, once per mention. The scores of
+    # a query are the columns of its predicates, and each query gets its own copies
+    # of the mentions it keeps.
+    def TopEntitiesFromMentionsBatch(self, parsers, mentions):
+        columns = {}  # predicate key -> column of the predicate
+        predicates = []
+        query_columns = []
+        for parser in parsers:
+            query_columns.append([])
+            for query_predicates in [parser.predicates, parser.excluding_predicates]:
+                for predicate in query_predicates:
+                    key = predicate.Key()
+                    if key not in columns:
+                        columns[key] = len(predicates)
+                        predicates.append(predicate)
+                query_columns[-1].append([columns[p.Key()] for p in query_predicates])
+        scorer = self.GetScorer(parsers[0], predicates, [])
+        results = [QueryResults(parser) for parser in parsers]
+        mentions = iter(mentions)
+        while not all(r.saturated for r in results):
+            batch = list(islice(mentions, self.mention_batch_size))
+            if not batch:
+                break
+            scores = scorer.ScoreMentions(batch).scores
+            for r, (cols, excluding_cols) in zip(results, query_columns):
+                if r.saturated:
+                    continue
+                excluded = (scores[:, excluding_cols] != 0).any(axis=1)
+                matrix = ScoreMatrix(r.weights, scores[:, cols], excluded)
+                rows = numpy.flatnonzero(matrix.Retained())
+                kept = [Mention(batch[k].span, batch[k].sentence_index)
+                        for k in rows.tolist()]
+                selected = matrix.Select(rows, self.GetEntityIds(kept, r.ent_ids),
+                                         len(r.ent_ids))
+                for j, score in enumerate(selected.MentionScores().tolist()):
+                    mention = kept[j]
+                    mention.score = score
+                    mention.score_table = selected.scores
+                    mention.row = j
+                    mention.debug = batch[rows[j]].debug
+                r.Add(selected, kept, len(batch))
+        return [self.GetEntities(r) for r in results]
+
+    # Returns the ranked entities of the query results.
+    def GetEntities(self, results):
+        entities = results.Entities()
+        if self.compact:
+            self.StripEntities(entities)
+            entities.mentions = None
+        return entities
+
+    # Returns a scorer for the query, or for the given predicates instead of those of
+    # the query, sharing the per-document state of the extractor.
+    def GetScorer(self, parser, predicates=None, excluding_predicates=None):
+        url = parser.sentence_decomposer_server_url
+        if url not in self.semantic_scorers:
+            self.semantic_scorers[url] = SemanticScorer(self.doc, url, self.matcher)
+        if predicates is None:
+            predicates = parser.predicates
+            excluding_predicates = parser.excluding_predicates
+        return Scorer(self.doc, self.matcher, predicates, excluding_predicates,
+                      url, dictionaries=self.dictionaries,
+                      semantic_scorer=self.semantic_scorers[url])
 
     def GetSpans(self, etype):
         # Collect all spans of the given type
@@ -104,11 +465,12 @@ class EntityExtractor:
             spans = self.doc.ents
         elif etype == "NPs":
             spans = self.doc.noun_chunks
+        elif etype[:5] == "Dict(":
+            return self.GetDictionarySpans(etype)
         elif etype[:6] == "Ngrams":
-            bounds = [int(x) for x in etype[7:-1].split(',')]
-            for length in range(bounds[0], bounds[1] + 1):
-                for i in range(len(self.doc)-length):
-                    spans.append(self.doc[i:i+length])
+            # Already in start order.
+            return [self.doc[start:end] for starts, ends in self.IterNgrams(etype)
+                    for start, end in zip(starts.tolist(), ends.tolist())]
         else:
             etype = etype.lower()
             for i in range(len(self.doc.ents)):
@@ -116,6 +478,136 @@ class EntityExtractor:
                     spans.append(self.doc.ents[i])
         return sorted(spans, key=lambda x: x.start, reverse=False)
 
+    # Returns the spans of the entries of the dictionary of a Dict(name) type, in
+    # start order, found in a single pass over the document. Dict(name,normalized)
+    # matches entries up to case and accents; otherwise the text of a span must be an
+    # entry.
+    def GetDictionarySpans(self, etype):
+        args = etype[5:-1].split(',')
+        classifier = self.dictionaries.Get(args[0])
+        if classifier is None:
+            return []
+        normalized = 'normalized' in args[1:]
+        spans = []
+        for start, end in classifier.FindEntries(self.matcher.tokens, self.matcher.index):
+            span = self.doc[start:end]
+            if normalized or classifier.is_entity(span.text):
+                spans.append(span)
+        return spans
+
+    # Yields the arrays of the starts and ends of the Ngrams(a,b) spans, by blocks of
+    # start positions, in start order and then length order. Like the other span
+    # types, spans do not include the last token of the document.
+    def IterNgrams(self, etype):
+        bounds = [int(x) for x in etype[7:-1].split(',')]
+        lengths = numpy.arange(bounds[0], bounds[1] + 1, dtype=numpy.int64)
+        n = len(self.doc)
+        for first in range(0, n, self.ngram_block_size):
+            positions = numpy.arange(first, min(first + self.ngram_block_size, n),
+                                     dtype=numpy.int64)
+            starts = numpy.repeat(positions, len(lengths))
+            ends = starts + numpy.tile(lengths, len(positions))
+            keep = ends < n
+            yield starts[keep], ends[keep]
+
+    # Returns the mask of the tokens made of punctuation only.
+    def GetPunctuationMask(self):
+        if self.punctuation_mask is None:
+            ids, inverse = numpy.unique(self.matcher.token_ids, return_inverse=True)
+            is_punctuation = numpy.array(
+                [all(c in punctuation for c in vocabulary.Word(i)) for i in ids.tolist()],
+                dtype=bool)
+            self.punctuation_mask = is_punctuation[inverse]
+        return self.punctuation_mask
+
+    # Returns the masks of the token positions where a mention must start or end to
+    # be able to score above 0, from the hits of the left and right contexts of the
+    # query, or None if some predicate with a positive weight can score without a
+    # context hit. A left context hit at s covers starts in [s + n, s + n + window],
+    # and a right context hit at s covers ends in [s - window, s].
+    def GetContextWindows(self, parser):
+        n = len(self.doc)
+        counts = {'left': numpy.zeros(n + 2, dtype=numpy.int64),
+                  'right': numpy.zeros(n + 2, dtype=numpy.int64)}
+        for predicate in parser.predicates:
+            if predicate.weight <= 0:
+                continue
+            if predicate.matching != 'syntactic' or predicate.type not in counts:
+                return None
+            context = predicate.normalized_context
+            hits = numpy.array(self.matcher.index.FindAllOccurrences(context),
+                               dtype=numpy.int64)
+            first = hits + len(context) if predicate.type == 'left' else \
+                hits - predicate.window
+            numpy.add.at(counts[predicate.type], numpy.clip(first, 0, n + 1), 1)
+            numpy.add.at(counts[predicate.type],
+                         numpy.clip(first + predicate.window + 1, 0, n + 1), -1)
+        return (numpy.cumsum(counts['left'])[:n + 1] > 0,
+                numpy.cumsum(counts['right'])[:n + 1] > 0)
+
+    # Yields the arrays of the starts and ends of the Ngrams(a,b) spans that start or
+    # end in the given windows, by blocks, in the same order as IterNgrams.
+    def IterContextNgrams(self, etype, windows):
+        bounds = [int(x) for x in etype[7:-1].split(',')]
+        lengths = numpy.arange(bounds[0], bounds[1] + 1, dtype=numpy.int64)
+        n = len(self.doc)
+        start_window, end_window = windows
+        by_start = numpy.flatnonzero(start_window)
+        by_end = numpy.flatnonzero(end_window)
+        starts = numpy.concatenate((numpy.repeat(by_start, len(lengths)),
+                                    numpy.repeat(by_end, len(lengths)) -
+                                    numpy.tile(lengths, len(by_end))))
+        ends = numpy.concatenate((numpy.repeat(by_start, len(lengths)) +
+                                  numpy.tile(lengths, len(by_start)),
+                                  numpy.repeat(by_end, len(lengths))))
+        keep = (starts >= 0) & (ends < n)
+        keys = numpy.unique(starts[keep] * (n + 1) + ends[keep])
+        block_size = self.ngram_block_size * len(lengths)
+        for first in range(0, len(keys), block_size):
+            block = keys[first:first + block_size]
+            yield block // (n + 1), block % (n + 1)
+
+    # Yields the mentions of the spans of the given type that lie within a sentence,
+    # in start order. Ngrams candidates are generated lazily, and rejected before any
+    # span is created when they cross a sentence boundary, or start or end with
+    # punctuation if skip_punctuation is set. With context windows (see
+    # GetContextWindows), only the spans starting or ending in them are considered.
+    def IterMentions(self, etype, windows=None):
+        if etype[:6] != "Ngrams":
+            spans, sentences = self.GetSentenceSpans(etype)
+            if windows is not None:
+                start_window, end_window = windows
+            for span, si in zip(spans, sentences):
+                if windows is None or start_window[span.start] or end_window[span.end]:
+                    yield Mention(span, si)
+            return
+        candidates = self.IterNgrams(etype) if windows is None else \
+            self.IterContextNgrams(etype, windows)
+        for starts, ends in candidates:
+            sentences = self.sentence_table.JoinSpans(starts, ends)
+            keep = sentences >= 0
+            if self.skip_punctuation:
+                mask = self.GetPunctuationMask()
+                keep &= ~mask[starts] & ~mask[numpy.maximum(ends - 1, starts)]
+            for start, end, si in zip(starts[keep].tolist(), ends[keep].tolist(),
+                                      sentences[keep].tolist()):
+                yield Mention(self.doc[start:end], si)
+
+    # Returns the spans of the given type, other than Ngrams, that lie within a
+    # sentence, and their sentence indices. They are computed once per type.
+    def GetSentenceSpans(self, etype):
+        if etype not in self.sentence_spans:
+            spans = self.GetSpans(etype)
+            starts = numpy.fromiter((span.start for span in spans), dtype=numpy.int64,
+                                    count=len(spans))
+            ends = numpy.fromiter((span.end for span in spans), dtype=numpy.int64,
+                                  count=len(spans))
+            sentences = self.sentence_table.JoinSpans(starts, ends)
+            keep = numpy.flatnonzero(sentences >= 0)
+            self.sentence_spans[etype] = ([spans[k] for k in keep.tolist()],
+                                          sentences[keep].tolist())
+        return self.sentence_spans[etype]
+
     def GetMentionsFromSpans(self, spans):
         mentions = []
         for span in spans:
@@ -125,78 +617,59 @@ class EntityExtractor:
             mentions.append(mention)
         return mentions
 
+    # Returns a mention for every span that ends within the first sentence ending
+    # after its start.
     def JoinSpansAndSentences(self, spans):
-        mentions = []
-        sents = [sent for sent in self.doc.sents]
-        si = 0
-        i = 0
-        while i < len(spans):
-            #print(i, si)
-            sent = sents[si]
-            span = spans[i]
-            #print(span.start, span.end, sent.start, sent.end)
-            if sent.end <= span.start:
-                si += 1
-                continue
-            if span.end <= sent.end:
-                mentions.append(Mention(span, si))
-            i += 1
-        return mentions
+        starts = numpy.fromiter((span.start for span in spans), dtype=numpy.int64,
+                                count=len(spans))
+        ends = numpy.fromiter((span.end for span in spans), dtype=numpy.int64,
+                              count=len(spans))
+        sentences = self.sentence_table.JoinSpans(starts, ends).tolist()
+        return [Mention(span, si) for span, si in zip(spans, sentences) if si >= 0]
     
+    # Returns a mention for every occurrence of every distinct ngram of spans that
+    # lies inside a sentence, without ending at its last token. Occurrences are
+    # read from the document suffix array around the rank of each ngram's span.
     def FindAllMentions(self, spans):
-        print("GenerateAllMentions")
+        sentence_of = self.sentence_table.token_sentences
+        sentence_ends = self.sentence_table.ends
+        suffix_array = self.matcher.suffix_array
         mentions = []
-        print("Deduplicate ngrams")
         ngrams = set(Ngram(self.doc, span) for span in spans)
-        ## This is very slow for large documents.
         for ngram in ngrams:
-            print(' '.join(ngram.tokens()))
             n = len(ngram)
-            si = -1
-            for sent in self.doc.sents:
-                si += 1
-                for i in range(sent.start, sent.end - n):
-                    if self.matcher.MatchesNgram(i, ngram.tokens()):
-                        mentions.append(Mention(self.doc[i: i + n], si))
-        return mentions
-
-    def FilterMentions(self, mentions):
-        return [mention for mention in mentions if mention.score > 0]
-
-    def FilterEntities(self, entities, threshold):
-        return [e for e in entities if e.score >= threshold]
+            if n == 0:
+                starts = numpy.arange(len(self.doc), dtype=numpy.int64)
+            else:
+                starts = numpy.array(suffix_array.OccurrencesAt(ngram.span.start, n),
+                                     dtype=numpy.int64)
+            si = sentence_of[starts]
+            inside = si >= 0
+            inside[inside] = starts[inside] + n < sentence_ends[si[inside]]
+            for i, si in zip(starts[inside].tolist(), si[inside].tolist()):
+                mentions.append(Mention(self.doc[i:i + n], si))
+        return sorted(mentions, key=lambda m: (m.span.start, m.span.end))
 
     def StripEntities(self, entities):
         for e in entities:
             e.strip()
 
-    def ClusterMentions(self, mentions):
-        ent_dict = {}
+    # Returns the ids of the entities of the mentions, which are grouped by the token
+    # ids of their spans. New entities are added to ent_ids and numbered in order.
+    def GetEntityIds(self, mentions, ent_ids):
+        tokens = self.matcher.tokens
+        ids = []
         for mention in mentions:
-            name = mention.span.text.lower()
-            if name not in ent_dict:
-                ent_dict[name] = Entity(mention.span)
-            ent_dict[name].mentions.append(mention)
-        return ent_dict.values()
+            name = tuple(tokens[mention.span.start:mention.span.end])
+            ids.append(ent_ids.setdefault(name, len(ent_ids)))
+        return ids
 
     def GetSentence(self, mention):
-        for sent in self.doc.sents:
-            if mention.span.start >= sent.start and mention.span.end <= sent.end:
-                return sent.text
-        return "None"
+        si = self.GetSentenceNumber(mention)
+        return self.sentence_table.Sentence(si).text if si >= 0 else "None"
 
     def GetSpanSentenceNumber(self, span):
-        sentence_index = -1
-        for sent in self.doc.sents:
-            sentence_index += 1
-            if span.start >= sent.start and span.end <= sent.end:
-                return sentence_index
-        return -1
+        return self.sentence_table.SpanSentence(span.start, span.end)
     
     def GetSentenceNumber(self, mention):
-        sentence_index = -1
-        for sent in self.doc.sents:
-            sentence_index += 1
-            if mention.span.start >= sent.start and mention.span.end <= sent.end:
-                return sentence_index
-        return -1
+        return self.GetSpanSentenceNumber(mention.span)
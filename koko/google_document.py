@@ -21,7 +21,7 @@ import httplib2
 import os
 from googleapiclient import discovery
 from oauth2client.client import GoogleCredentials
-from .segmenter import SegmentedDocument, Segment, SegmentedSpan
+from .segmenter import SegmentedDocument, SegmentStore, SegmentedSpan
 
 os.environ['GOOGLE_APPLICATION_CREDENTIALS'] = './google_APIconfig.json'
         
@@ -41,14 +41,14 @@ class GoogleDocument(SegmentedDocument):
 
     def populate_tokens(self):
         #print("populate_tokens")
-        self.segments = []
+        self.segments = SegmentStore(self.text)
         chunk_offset = 0
         i = 0
         for chunk in self.chunks:
             #print("chunk", i, ":", len(chunk), "chars")
             response = self.analyze_chunk_syntax(chunk)
             self.chunk_syntax_responses.append(response)
-            self.segments += self.get_segments(response['tokens'], chunk_offset)
+            self.get_segments(response['tokens'], chunk_offset)
             chunk_offset += len(chunk)
             i += 1
         #for s in self.segments:
@@ -58,10 +58,8 @@ class GoogleDocument(SegmentedDocument):
         pos = -1
         self.beginOffset2pos = {}
         self.endOffset2pos = {}
-        for segment in self.segments:
+        for start, end in zip(self.segments.starts, self.segments.ends):
             pos += 1
-            start = segment.start
-            end = segment.end
             self.beginOffset2pos[start] = pos
             self.endOffset2pos[end] = pos + 1
         
@@ -94,15 +92,15 @@ class GoogleDocument(SegmentedDocument):
         self.noun_chunks = self.ents
 
     def get_segments(self, objs, chunk_offset=0):
-        segments = []
+        segments = self.segments
         for obj in objs:
             span = obj['text']
             beginOffset = chunk_offset + span['beginOffset']
             text = span['content']
             endOffset = beginOffset + len(text)
-            prevSegmentEndOffset = -1 if not segments else segments[-1].end
-            segments.append(Segment(self.text, 0, beginOffset, \
-                                         beginOffset, endOffset, beginOffset==prevSegmentEndOffset))
+            prevSegmentEndOffset = -1 if not segments else segments.ends[-1]
+            segments.append(0, beginOffset, beginOffset, endOffset,
+                            beginOffset==prevSegmentEndOffset)
         return segments
             
     def get_resolved_spans(self, objs, chunk_offset=0, syntax_type=''):
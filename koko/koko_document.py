@@ -14,32 +14,55 @@ See the License for the specific language governing permissions and
 limitations under the License.
 '''
 
-from .segmenter import SegmentedDocument
+from array import array
+import numpy
+from .segmenter import SegmentedDocument, SpanList
+
+# Token kinds used by the sentence and entity heuristics.
+PERIOD = 1
+TITLE = 2
+
+
+def token_kind(text):
+    return (PERIOD if text == '.' else 0) | (TITLE if text.istitle() else 0)
+
+
+def position_array(positions):
+    return array('q', numpy.asarray(positions, dtype=numpy.int64).tobytes())
 
 class KokoDocument(SegmentedDocument):
 
-    def __init__(self, text):
-        super().__init__(text)
-        # Simple-minded sentence extraction.
-        self.__PopulateSents()
-        # Simple heuristic for entity extraction
-        self.ents = self.__GetNgramsWithCapitalizedWords()
+    # Segments, and the (starts, ends) token positions of sentences and entities, can
+    # be passed in to restore a document that was already analyzed (see DocumentCache).
+    def __init__(self, text, segments=None, sents=None, ents=None):
+        super().__init__(text, segments)
+        if sents is None or ents is None:
+            kinds = self.__TokenKinds()
+        if sents is None:
+            # Simple-minded sentence extraction.
+            self.sents = self.__GetSents(kinds)
+        else:
+            self.sents = SpanList(self, *sents)
+        if ents is None:
+            # Simple heuristic for entity extraction
+            self.ents = self.__GetNgramsWithCapitalizedWords(kinds)
+        else:
+            self.ents = SpanList(self, *ents)
         # Noun chunks not implemented
         self.noun_chunks = self.ents
         self.is_parsed = True
 
-    def __GetMaximalNgrams(self, condition):
-        spans = []
-        prev = False
-        for pos in range(len(self)):
-            curr = condition(pos)
-            if curr != prev:
-                if curr:
-                    start = pos
-                else:
-                    spans.append(self[start:pos])
-                prev = curr
-        return spans
+    # Returns the array of the kinds of all tokens, in one pass over the token texts.
+    # Each distinct text is classified once.
+    def __TokenKinds(self):
+        kinds = {}
+        def kind(text):
+            k = kinds.get(text)
+            if k is None:
+                k = kinds[text] = token_kind(text)
+            return k
+        return numpy.fromiter((kind(text) for text in self.TokenTexts()),
+                              dtype=numpy.int8, count=len(self))
 
     def __GetMaximalNgrams2(self, condition):
         spans = []
@@ -59,16 +82,23 @@ class KokoDocument(SegmentedDocument):
                 print("End entity: ", self[start:pos].text)
         return spans
 
-    # Extracts maximal ngrams with capitalized tokens.
-    def __GetNgramsWithCapitalizedWords(self):
-        return self.__GetMaximalNgrams(lambda pos: self[pos].text.istitle())
+    # Extracts maximal ngrams with capitalized tokens. A run reaching the end of the
+    # document is not closed, and not extracted.
+    def __GetNgramsWithCapitalizedWords(self, kinds):
+        title = numpy.zeros(len(kinds) + 1, dtype=numpy.int8)
+        title[1:] = (kinds & TITLE) != 0
+        changes = numpy.diff(title)
+        starts = numpy.flatnonzero(changes == 1)
+        ends = numpy.flatnonzero(changes == -1)
+        return SpanList(self, position_array(starts[:len(ends)]), position_array(ends))
 
-    def __PopulateSents(self):
-        self.sents = []
-        start = 0
-        for pos in range(len(self)):
-            if self[pos].text == '.' or pos == len(self) - 1 or \
-               self[pos + 1].row != self[pos].row:
-                end = pos + 1
-                self.sents.append(self[start:end])
-                start = end
+    # Sentences end at a period, at a line break, or at the end of the document.
+    def __GetSents(self, kinds):
+        rows = self.TokenRows()
+        boundaries = (kinds & PERIOD) != 0
+        boundaries[:-1] |= rows[1:] != rows[:-1]
+        boundaries[-1:] = True
+        ends = numpy.flatnonzero(boundaries) + 1
+        starts = numpy.zeros_like(ends)
+        starts[1:] = ends[:-1]
+        return SpanList(self, position_array(starts), position_array(ends))
@@ -17,6 +17,7 @@ limitations under the License.
 from .entity_extractor import EntityExtractor
 from .parser import Parser
 from .koko_document import KokoDocument
+from .segmenter import MappedText
 import sys
 
 def run(query_file):
@@ -31,8 +32,7 @@ def run(query_file):
     
     print("Rewritten query:\n", parser.toString())
         
-    with open(parser.document_name, 'r') as myfile:
-        document = myfile.read()
+    document = MappedText(parser.document_name)
         
     extractor = EntityExtractor(KokoDocument(document), True)
     entities = extractor.TopEntities(query)
@@ -14,7 +14,31 @@ See the License for the specific language governing permissions and
 limitations under the License.
 '''
 
-from unidecode import unidecode
+from .context_matcher import ContextMatcher
+from .document_index import DocumentIndex
+from .segmenter import SegmentedDocument
+from .suffix_array import SuffixArray
+from .vocabulary import vocabulary
+
+
+# Returns the int32 array of the vocabulary ids of the normalized tokens of doc. The
+# array is built once per document and kept on the document when it accepts new
+# attributes.
+def get_token_ids(doc):
+    token_ids = getattr(doc, 'token_ids', None)
+    if token_ids is not None:
+        return token_ids
+    if isinstance(doc, SegmentedDocument):
+        texts = doc.TokenTexts()
+    else:
+        texts = (doc[i].text for i in range(len(doc)))
+    token_ids = vocabulary.TokenIds(texts, len(doc))
+    try:
+        doc.token_ids = token_ids
+    except AttributeError:
+        pass
+    return token_ids
+
 
 class Ngram:
 
@@ -45,19 +69,40 @@ class Matcher:
 
     def __init__(self, doc):
         self.doc = doc
+        self.token_ids = get_token_ids(doc)
+        self.tokens = self.token_ids.tolist()
+        self.document_index = None
+        self.document_suffix_array = None
+
+    # The positional index of the document, built on first use.
+    @property
+    def index(self):
+        if self.document_index is None:
+            self.document_index = DocumentIndex(self.tokens)
+        return self.document_index
+
+    # The suffix array of the document, built on first use.
+    @property
+    def suffix_array(self):
+        if self.document_suffix_array is None:
+            self.document_suffix_array = SuffixArray(self.token_ids)
+        return self.document_suffix_array
 
     # Checks if the document token at position pos matches the j-th ngram token
     def TokenMatches(self, ngram, pos, j, case_sensitive=False):
         if pos < 0 or pos >= len(self.doc):
             return False
         return (self.doc[pos].text == ngram[j]) if case_sensitive else \
-            (unidecode(self.doc[pos].text).lower() == unidecode(ngram[j]).lower())
+            (self.tokens[pos] == vocabulary.TokenId(ngram[j]))
 
     # Returns True if the document matches the ngram at position pos, False otherwise.
     # By default, direction = 1 to match at the right of pos, including the token at pos.
     # Use direction = -1 for matching at the left of pos, excluding the token
     # at pos.
     def MatchesNgram(self, pos, ngram, direction=1, case_sensitive=False):
+        if not case_sensitive:
+            return self.MatchesNormalizedNgram(pos, [vocabulary.TokenId(t) for t in ngram],
+                                               direction)
         offset = 0 if direction > 0 else -1  # skip token at pos for reverse match
         for i in range(len(ngram)):
             j = offset + direction * i
@@ -65,9 +110,29 @@ class Matcher:
                 return False
         return True
 
-    def FindNgram(self, ngram):
+    # Same as MatchesNgram, for a list of the vocabulary ids of the normalized ngram
+    # tokens.
+    def MatchesNormalizedNgram(self, pos, ngram, direction=1):
         n = len(ngram)
-        for pos in range(len(self.doc) - n + 1):
-            if self.MatchesNgram(pos, ngram):
-                return pos, pos + n
-        return 0, 0
+        if not n:
+            return True
+        if direction > 0:
+            return pos >= 0 and pos + n <= len(self.tokens) and \
+                self.tokens[pos:pos + n] == ngram
+        return pos >= n and pos <= len(self.tokens) and self.tokens[pos - n:pos] == ngram
+
+    def FindNgram(self, ngram):
+        return self.index.FindNgram([vocabulary.TokenId(t) for t in ngram])
+
+    # Returns the sorted start positions of all occurrences of the ngram.
+    def FindAllOccurrences(self, ngram):
+        return self.index.FindAllOccurrences([vocabulary.TokenId(t) for t in ngram])
+
+    # Finds the occurrences of many ngrams of token ids in a single pass over the
+    # document, and stores them in the index, so later lookups don't rescan.
+    def FindAllNgrams(self, ngrams):
+        index = self.index
+        missing = [ngram for ngram in ngrams
+                   if ngram and tuple(ngram) not in index.occurrences]
+        if missing:
+            index.occurrences.update(ContextMatcher(missing).FindAll(self.tokens, index))
@@ -26,11 +26,13 @@ limitations under the License.
 #             (type(x) is "Exercises" {2}) or
 #             (str(x) contains "Cafe" {1}) or (str(x) contains "Roasters" {1})
 #   with threshold 0.8
+#   limit 20
 ###
 
 
 from .segmenter import SegmentedDocument
 from .query_expander import create_query_expanders, tokenize_phrase, expand_phrase
+from .vocabulary import vocabulary
 
 query_expanders = None
 
@@ -41,6 +43,8 @@ class Predicate:
     # weight: score multiplier
     # matching: syntactic or semantic
     # expanded_queries: a set of expanded queries through query expansion
+    # normalized_context: the vocabulary ids of the normalized context tokens, used
+    #                     for syntactic matching
 
     def __init__(self, type, context, window=0, weight = 1,
                  matching ='syntactic', expanded_queries = [], pattern=''):
@@ -52,6 +56,17 @@ class Predicate:
         self.expanded_queries = expanded_queries
         self.pattern = pattern
         self.next = None
+        self.normalized_context = [vocabulary.TokenId(t) for t in context] \
+            if isinstance(context, list) else []
+
+    # Returns a key identifying the predicate up to its weight: predicates with the
+    # same key score mentions the same.
+    def Key(self):
+        context = tuple(self.context) if isinstance(self.context, list) else self.context
+        expanded_queries = tuple((tuple(tokens), score)
+                                 for (tokens, score) in self.expanded_queries)
+        return (self.type, context, self.window, self.matching, expanded_queries,
+                self.pattern, self.next.Key() if self.next else None)
 
     def toString(self, rewritten = True, weight = True):
         context = '"' + ' '.join(self.context) + '"'
@@ -93,6 +108,7 @@ class Parser:
         self.predicates = []
         self.excluding_predicates = []
         self.threshold = 0
+        self.limit = 0  # maximum number of entities returned, 0 for no limit
         self.lines = []
         self.curr_pos = 0
         self.error_msg = ''
@@ -111,6 +127,8 @@ class Parser:
         if self.excluding_predicates:
             s += 'excluding\n\t%s\n' % '\n\t'.join([p.toString()
                                                   for p in self.excluding_predicates])
+        if self.limit:
+            s += 'limit %d\n' % self.limit
         if self.sentence_decomposer_server_url:
             s += 'using sentence decomposition server "%s"\n' % self.sentence_decomposer_server_url
         return s
@@ -181,6 +199,8 @@ class Parser:
                 self.ExcludingCondition()
             elif self.Match('using'):
                 self.UsingDecompositionServer()
+            elif self.Match('limit'):
+                self.Limit()
 
     def DocumentName(self):
         self.document_name = self.QuotedString()[0]
@@ -250,6 +270,14 @@ class Parser:
         self.threshold = float(self.CurrToken().text)
         self.Advance()
 
+    def Limit(self):
+        self.Literal('limit')
+        assert(not self.AtEnd()), "unexpected end of query, expecting a number"
+        assert(self.CurrToken().text.isdigit()), "unexpected token '%s', expecting a number" % \
+            self.CurrToken().text
+        self.limit = int(self.CurrToken().text)
+        self.Advance()
+
     def UsingDecompositionServer(self):
         self.Literal('using')
         self.Literal('sentence')
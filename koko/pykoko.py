@@ -16,7 +16,8 @@ import logging
 from .query_processor import QueryProcessor
 
 
-def run(query_file, doc_parser="koko", output_format="text", log_level="info"):
+def run(query_file, doc_parser="koko", output_format="text", log_level="info",
+        cache_dir=None):
     # Set up logging
     logging_level_dict = {'info': logging.INFO,
                           'warning': logging.WARNING,
@@ -34,7 +35,7 @@ def run(query_file, doc_parser="koko", output_format="text", log_level="info"):
 
     # Process the KOKO query
 
-    processor = QueryProcessor(doc_parser)
+    processor = QueryProcessor(doc_parser, cache_dir=cache_dir)
     response = processor.ProcessQuery(query)
 
     # Print the results
@@ -15,10 +15,19 @@ limitations under the License.
 '''
 
 from .parser import Parser
+from .document_cache import DocumentCache
 from .entity_extractor import EntityExtractor
 from .koko_document import KokoDocument
+from .segmenter import MappedText, Segmenter
+from .vocabulary import normalize_token
 from .google_document import GoogleDocument
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from functools import lru_cache
+from itertools import islice
+import glob
 import logging
+import os
 import spacy
 
 logger = logging.getLogger()
@@ -30,10 +39,144 @@ class KokoResponse:
         self.document = document
         self.entities = entities
 
+class KokoCorpusResponse:
+
+    # entities: the entities ranked by their score aggregated across documents
+    # document_entities: document path -> (name, score) of its entities, by rank
+    def __init__(self, query, documents, entities, document_entities):
+        self.query = query
+        self.documents = documents
+        self.entities = entities
+        self.document_entities = document_entities
+
+class KokoUpdate:
+    # An update of a streamed query (see QueryProcessor.IterQuery): the entities
+    # whose score changed since the previous update, by decreasing score, or, when
+    # final is set, the entities of the response of ProcessQuery. In corpus mode,
+    # there is an update for every document, in order, with its path and the
+    # (name, score) of its entities; the changed entities are then given as their
+    # (name, aggregated score), and the final ones are CorpusEntity objects.
+
+    def __init__(self, entities, final=False, document=None, document_entities=None):
+        self.entities = entities
+        self.final = final
+        self.document = document
+        self.document_entities = document_entities
+
+class CorpusEntity:
+    # An entity of a corpus query, identified by the normalized tokens of its name
+    # (see corpus_entity_key) and named as in the first document where it was found.
+    # document_scores holds the (document path, score) of the documents where it
+    # passed the query threshold, and total and maximum the sum and maximum of the
+    # scores.
+
+    __slots__ = ('name', 'score', 'document_scores', 'total', 'maximum')
+
+    def __init__(self, name):
+        self.name = name
+        self.score = 0.0
+        self.document_scores = []
+        self.total = 0
+        self.maximum = 0
+
+    def Add(self, document, score):
+        self.document_scores.append((document, score))
+        self.total += score
+        self.maximum = score if len(self.document_scores) == 1 else \
+            max(self.maximum, score)
+
+# Returns the normalized token texts of an entity name. Entities are grouped by
+# them within a document (see EntityExtractor.GetEntityIds), and so across the
+# documents of a corpus.
+@lru_cache(maxsize=1 << 16)
+def corpus_entity_key(name):
+    return tuple(normalize_token(segment.text)
+                 for segment in Segmenter.Segment(name, engine='characters'))
+
+# Cross-document aggregations of the scores of an entity.
+corpus_aggregations = {
+    'max': lambda entity: entity.maximum,
+    'sum': lambda entity: entity.total,
+    'mean': lambda entity: entity.total / len(entity.document_scores),
+}
+
+# Returns the paths of the documents of a corpus, or None if name is a single
+# document. A corpus is a directory (its files, sorted, but for hidden files and
+# manifests), a glob pattern (the matching files, sorted), or a manifest: a file
+# with the .manifest extension that lists one path per line, relative to the
+# manifest directory. An existing file is a single document even if its name looks
+# like a glob pattern.
+def corpus_paths(name):
+    if os.path.isfile(name) and not name.endswith('.manifest'):
+        return None
+    if os.path.isdir(name):
+        paths = [os.path.join(name, f) for f in os.listdir(name)
+                 if not f.startswith('.') and not f.endswith('.manifest')]
+        return sorted(path for path in paths if os.path.isfile(path))
+    if any(c in name for c in '*?['):
+        return sorted(path for path in glob.glob(name, recursive=True)
+                      if os.path.isfile(path))
+    if name.endswith('.manifest'):
+        directory = os.path.dirname(name)
+        with open(name, 'r') as manifest:
+            return [os.path.join(directory, line.strip()) for line in manifest
+                    if line.strip() and not line.startswith('#')]
+    return None
+
+class CorpusWorker:
+    # Runs a query on documents of a corpus. The query is parsed, and the query
+    # expanders are loaded, once per worker; dictionaries are loaded once per process
+    # on first use (see DictionaryRegistry).
+
+    def __init__(self, query, document_parser, cache_dir, limit):
+        self.processor = QueryProcessor(document_parser, cache_dir, compact_results=True)
+        self.parser = Parser(query)
+        self.parser.limit = limit
+
+    # Returns the (name, score) of the entities of a document, by rank. Documents
+    # that can't be read or decoded have no entities.
+    def Process(self, path):
+        try:
+            doc = self.processor.LoadDocument(path)
+        except (OSError, UnicodeError, ValueError) as error:
+            logger.warning("Skipping document %s: %s" % (path, error))
+            return []
+        extractor = EntityExtractor(doc, compact=True)
+        entities = extractor.TopEntitiesForParsedQuery(self.parser)
+        return [(entity.name, entity.score) for entity in entities]
+
+# The CorpusWorker of a worker process, and the (query, document_parser, cache_dir,
+# limit) it was created for.
+corpus_worker = None
+corpus_worker_args = None
+
+# Processes documents in a worker process. The CorpusWorker is created by the first
+# call of a query, rather than by a pool initializer, which needs Python 3.7.
+def process_corpus_documents(worker_args, paths):
+    global corpus_worker, corpus_worker_args
+    if worker_args != corpus_worker_args:
+        corpus_worker = CorpusWorker(*worker_args)
+        corpus_worker_args = worker_args
+    return [corpus_worker.Process(path) for path in paths]
+
 class QueryProcessor:
     
-    def __init__(self, document_parser='koko'):
+    # Tokenized koko documents read from files are cached in cache_dir, if given
+    # (there is no cache by default). With compact_results, the returned entities
+    # are stripped of their spans and mention details.
+    # Queries on a corpus (see corpus_paths) run in max_workers processes (one per
+    # core if None, in this process if 1), and the scores of an entity in the
+    # documents are aggregated by corpus_aggregation: max, sum or mean.
+    def __init__(self, document_parser='koko', cache_dir=None, compact_results=False,
+                 max_workers=None, corpus_aggregation='max'):
         self.document_parser = document_parser
+        self.compact_results = compact_results
+        self.cache_dir = cache_dir
+        self.max_workers = max_workers
+        assert corpus_aggregation in corpus_aggregations, \
+            'unknown corpus aggregation: %s' % corpus_aggregation
+        self.corpus_aggregation = corpus_aggregation
+        self.document_cache = DocumentCache(cache_dir) if cache_dir else None
         if self.document_parser == 'spacy':
             logger.info("Loading SpaCy English models")
             self.nlp = spacy.load('en')
@@ -46,18 +189,141 @@ class QueryProcessor:
             return None
         print("Parsed query:", query_parser.toString())
         if not document:
-            with open(query_parser.document_name, 'r') as myfile:
-                document = myfile.read()
+            paths = corpus_paths(query_parser.document_name)
+            if paths is not None:
+                return self.ProcessCorpusQuery(query, paths, query_parser.limit)
+        doc = self.LoadDocument(query_parser.document_name, document)
+        if doc is None:
+            return None
+        extractor = EntityExtractor(doc, compact=self.compact_results)
+        entities = extractor.TopEntitiesForParsedQuery(query_parser)
+        # Mapped documents are decoded, so the response holds the text of the document.
+        return KokoResponse(query, document or str(doc.text), entities)
+
+    # Streaming version of ProcessQuery: yields KokoUpdates as entities are found,
+    # for every document in corpus mode, and finally the ranked entities. The
+    # updates do not hold the document text. For an invalid query or document, only
+    # yields an empty final update.
+    def IterQuery(self, query, document=None):
+        query_parser = Parser(query)
+        if not query_parser.is_parsed:
+            logger.error("Syntax error: %s" % query_parser.error_msg)
+            yield KokoUpdate([], final=True)
+            return
+        if not document:
+            paths = corpus_paths(query_parser.document_name)
+            if paths is not None:
+                yield from self.IterCorpusQuery(query, paths, query_parser.limit)
+                return
+        doc = self.LoadDocument(query_parser.document_name, document)
+        if doc is None:
+            yield KokoUpdate([], final=True)
+            return
+        extractor = EntityExtractor(doc, compact=self.compact_results)
+        for update in extractor.IterTopEntitiesForParsedQuery(query_parser):
+            yield KokoUpdate(update.entities, update.final)
+
+    # Returns the parsed document, read from the file document_name unless the
+    # document text is given.
+    def LoadDocument(self, document_name, document=None):
+        if not document:
+            if self.document_parser == 'koko':
+                # Map the file instead of reading it; KokoDocument segments it in blocks.
+                document = MappedText(document_name)
+            else:
+                with open(document_name, 'r') as myfile:
+                    document = myfile.read()
         if self.document_parser == 'koko':
-            doc = KokoDocument(document)
+            if self.document_cache and isinstance(document, MappedText):
+                doc = self.document_cache.GetDocument(document)
+            else:
+                doc = KokoDocument(document)
         elif self.document_parser == 'spacy':
             doc = self.nlp(document)
         elif self.document_parser == 'google':
             doc = GoogleDocument(document)
         else:
-            logger.error("Unknown parser: %s" % document_parser)
+            logger.error("Unknown parser: %s" % self.document_parser)
             return None
-        extractor = EntityExtractor(doc)
-        entities = extractor.TopEntitiesForParsedQuery(query_parser)
-        return KokoResponse(query, document, entities)
+        return doc
+
+    # Runs the query on the documents of a corpus, and ranks the entities by their
+    # score aggregated across documents (see IterCorpusQuery).
+    def ProcessCorpusQuery(self, query, paths, limit=0):
+        document_entities = {}
+        for update in self.IterCorpusQuery(query, paths, limit):
+            if update.final:
+                entities = update.entities
+            else:
+                document_entities[update.document] = update.document_entities
+        return KokoCorpusResponse(query, paths, entities, document_entities)
+
+    # Yields a KokoUpdate for every document of the corpus, as soon as it is
+    # processed, with the corpus entities whose aggregated score changed, and then
+    # the final ranking. With a limit, each document only returns its top entities
+    # for the max aggregation, which cannot change the top of the ranking; the other
+    # aggregations need all the entities of every document.
+    def IterCorpusQuery(self, query, paths, limit=0):
+        document_limit = limit if self.corpus_aggregation == 'max' else 0
+        entities = {}
+        for path, document_entities in self.IterCorpusResults(query, paths,
+                                                              document_limit):
+            changed = self.MergeCorpusEntities(entities, path, document_entities)
+            yield KokoUpdate(changed, document=path, document_entities=document_entities)
+        entities = self.RankCorpusEntities(entities.values())
+        if limit > 0:
+            entities = entities[:limit]
+        yield KokoUpdate(entities, final=True)
+
+    # Yields the path and the (name, score) entities of every document, in order.
+    # Documents are processed by a pool of worker processes, in chunks. At most one
+    # chunk more than there are workers is queued at a time, and if the caller stops
+    # early, the queued chunks that did not start are cancelled.
+    def IterCorpusResults(self, query, paths, limit=0):
+        if self.max_workers == 1:
+            worker = CorpusWorker(query, self.document_parser, self.cache_dir, limit)
+            for path in paths:
+                yield path, worker.Process(path)
+            return
+        executor = ProcessPoolExecutor(self.max_workers)
+        worker_args = (query, self.document_parser, self.cache_dir, limit)
+        workers = self.max_workers or os.cpu_count() or 1
+        chunksize = max(1, len(paths) // (4 * workers))
+        chunks = iter([paths[i:i + chunksize] for i in range(0, len(paths), chunksize)])
+        queued = deque()
+        try:
+            for chunk in islice(chunks, workers + 1):
+                queued.append((chunk, executor.submit(process_corpus_documents,
+                                                      worker_args, chunk)))
+            while queued:
+                chunk, future = queued.popleft()
+                results = future.result()
+                for next_chunk in islice(chunks, 1):
+                    queued.append((next_chunk, executor.submit(process_corpus_documents,
+                                                               worker_args, next_chunk)))
+                yield from zip(chunk, results)
+        finally:
+            for chunk, future in queued:
+                future.cancel()
+            executor.shutdown()
+
+    # Adds the (name, score) entities of a document to the corpus entities, and
+    # returns the (name, aggregated score) of those whose score changed, ranked.
+    def MergeCorpusEntities(self, entities, path, document_entities):
+        aggregate = corpus_aggregations[self.corpus_aggregation]
+        changed = []
+        for name, score in document_entities:
+            key = corpus_entity_key(name)
+            entity = entities.get(key)
+            if entity is None:
+                entity = entities[key] = CorpusEntity(name)
+            entity.Add(path, score)
+            aggregated = aggregate(entity)
+            if len(entity.document_scores) == 1 or aggregated != entity.score:
+                changed.append(entity)
+            entity.score = aggregated
+        return [(entity.name, entity.score) for entity in self.RankCorpusEntities(changed)]
 
+    # Returns the entities by decreasing score. Ties keep their order.
+    def RankCorpusEntities(self, entities):
+        return sorted(entities, key=lambda x: x.score, reverse=True)
@@ -31,6 +31,10 @@ op.add_option("--output_format",
               action="store", type="string", dest="output_format",
               default="text",
               help="Output format: text or json.")
+op.add_option("--cache_dir",
+              action="store", type="string", dest="cache_dir",
+              default=None,
+              help="Directory of the cache of tokenized documents (default: no cache).")
 op.add_option("--log_level",
               action="store", type="string", dest="log_level",
               default="info",
@@ -58,7 +62,7 @@ with open(opts.query_file, 'r') as qfile:
 # Process the KOKO query
 
 from query_processor import QueryProcessor
-processor = QueryProcessor(opts.doc_parser)
+processor = QueryProcessor(opts.doc_parser, cache_dir=opts.cache_dir)
 response = processor.ProcessQuery(query)
 
 # Print the results
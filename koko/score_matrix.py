@@ -0,0 +1,131 @@
+'''
+Copyright 2017 Recruit Institute of Technology
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+     http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+'''
+
+import numpy
+
+
+class ScoreMatrix:
+    # Predicate scores of a list of mentions: scores[m, i] is the score of mention m
+    # for predicate i, excluded[m] tells if the mention matched an excluding
+    # predicate, and entity_ids[m] is the index of the entity of the mention.
+    # Weighted sums are accumulated predicate by predicate and mention by mention,
+    # in the same order as Scorer, so the results are identical.
+
+    def __init__(self, weights, scores, excluded=None, entity_ids=None, num_entities=0):
+        self.weights = numpy.asarray(weights, dtype=numpy.float64)
+        self.scores = numpy.asarray(scores, dtype=numpy.float64)
+        n = len(self.scores)
+        self.excluded = excluded if excluded is not None else numpy.zeros(n, dtype=bool)
+        self.entity_ids = entity_ids if entity_ids is not None else \
+            numpy.zeros(n, dtype=numpy.int64)
+        self.num_entities = num_entities
+
+    def __len__(self):
+        return len(self.scores)
+
+    # Returns the rows of the given mentions, with their entity ids.
+    def Select(self, rows, entity_ids, num_entities):
+        return ScoreMatrix(self.weights, self.scores[rows], self.excluded[rows],
+                           numpy.asarray(entity_ids, dtype=numpy.int64), num_entities)
+
+    @staticmethod
+    def Concatenate(matrices, weights, num_entities):
+        if not matrices:
+            return ScoreMatrix(weights, numpy.zeros((0, len(weights))))
+        return ScoreMatrix(weights,
+                           numpy.concatenate([m.scores for m in matrices]),
+                           numpy.concatenate([m.excluded for m in matrices]),
+                           numpy.concatenate([m.entity_ids for m in matrices]),
+                           num_entities)
+
+    def Weights(self, weights=None):
+        return self.weights if weights is None else \
+            numpy.asarray(weights, dtype=numpy.float64)
+
+    # Returns the weighted sum of the columns of scores, accumulated column by column.
+    @staticmethod
+    def WeightedSum(scores, weights):
+        total = numpy.zeros(len(scores))
+        for i in range(len(weights)):
+            total += weights[i] * scores[:, i]
+        return total
+
+    # Returns the mask of the mentions that may score above 0 with some weights: the
+    # mentions that are not excluded and match some predicate.
+    def Retained(self):
+        return ~self.excluded & (self.scores != 0).any(axis=1)
+
+    # Returns the mention scores, or -1 for excluded mentions.
+    def MentionScores(self, weights=None):
+        scores = self.WeightedSum(self.scores, self.Weights(weights))
+        scores[self.excluded] = -1
+        return scores
+
+    # Returns the mask of the mentions with a positive score.
+    def Positive(self, weights=None):
+        return self.MentionScores(weights) > 0
+
+    # Returns the per-predicate sums of the scores of the positive mentions of every
+    # entity.
+    def EntitySums(self, weights=None):
+        positive = self.Positive(weights)
+        ids = self.entity_ids[positive]
+        scores = self.scores[positive]
+        sums = numpy.zeros((self.num_entities, self.scores.shape[1]))
+        for i in range(self.scores.shape[1]):
+            sums[:, i] = numpy.bincount(ids, weights=scores[:, i],
+                                        minlength=self.num_entities)
+        return sums
+
+    # Returns the entity scores, capped at 1 if cap is set.
+    def EntityScores(self, weights=None, sums=None, cap=True):
+        if sums is None:
+            sums = self.EntitySums(weights)
+        scores = self.WeightedSum(sums, self.Weights(weights))
+        return numpy.minimum(scores, 1) if cap else scores
+
+    # Returns the index of the first positive mention of every entity, or the number
+    # of mentions for entities without one. Entities are ranked in this order when
+    # their scores are equal.
+    def FirstPositive(self, weights=None):
+        first = numpy.full(self.num_entities, len(self.scores), dtype=numpy.int64)
+        rows = numpy.flatnonzero(self.Positive(weights))
+        numpy.minimum.at(first, self.entity_ids[rows], rows)
+        return first
+
+    # Returns the ids of the entities with a positive mention and a score of at least
+    # threshold, by decreasing score, and at most limit of them if limit > 0, together
+    # with the entity scores before capping and the entity predicate sums.
+    def Rank(self, weights=None, threshold=0, limit=0):
+        sums = self.EntitySums(weights)
+        totals = self.EntityScores(weights, sums, cap=False)
+        scores = numpy.minimum(totals, 1)
+        first = self.FirstPositive(weights)
+        ids = numpy.flatnonzero((first < len(self.scores)) & (scores >= threshold))
+        ids = ids[numpy.lexsort((first[ids], -scores[ids]))]
+        if limit > 0:
+            ids = ids[:limit]
+        return ids, totals, sums
+
+    # Returns True if there are at least k entities with a positive mention, and the
+    # k first ones, which win ties, have a score of 1.
+    def LeadersSaturated(self, k):
+        first = self.FirstPositive()
+        ids = numpy.flatnonzero(first < len(self.scores))
+        if len(ids) < k:
+            return False
+        leaders = ids[numpy.argsort(first[ids], kind='stable')[:k]]
+        return bool((self.EntityScores()[leaders] >= 1).all())
@@ -14,29 +14,49 @@ See the License for the specific language governing permissions and
 limitations under the License.
 '''
 
-from .entity_classifier import DictionaryEntityClassifier
+from .entity_classifier import dictionary_registry
+from .score_matrix import ScoreMatrix
 from .semantic_scorer import SemanticScorer
+from bisect import bisect_left
+import numpy
 import re
-import os, sys
-
-curr_dir = os.path.dirname(__file__)
-dic_path = curr_dir + '/dict/'
+import sys
 
 class Scorer:
 
+    # Dictionaries are read from a DictionaryRegistry, the process-wide registry of
+    # the koko dictionaries by default, on first use by a dict predicate. The
+    # semantic scorer can be shared by the scorers of the queries on a document (see
+    # EntityExtractor); it is created if not given.
     def __init__(self, doc, matcher, predicates, excluding_predicates=[],
-                 sentence_decomposer_server_url=''):
+                 sentence_decomposer_server_url='', dictionaries=None,
+                 semantic_scorer=None):
         self.doc = doc
         self.predicates = predicates
         self.excluding_predicates = excluding_predicates
         self.num_predicates = len(predicates)
-        self.entity_classifiers = dict()
-        for name in os.listdir(dic_path):
-            type_name = os.path.splitext(name)[0]
-            self.entity_classifiers[type_name] = \
-                DictionaryEntityClassifier(dic_path+name)
+        self.dictionaries = dictionaries if dictionaries is not None else \
+            dictionary_registry
+        self.entity_classifiers = {}  # type name -> classifier, looked up once
         self.matcher = matcher
-        self.semantic_scorer = SemanticScorer(self.doc, sentence_decomposer_server_url)
+        if semantic_scorer is None:
+            semantic_scorer = SemanticScorer(self.doc, sentence_decomposer_server_url,
+                                             matcher)
+        self.semantic_scorer = semantic_scorer
+        # Find the hits of all the syntactic contexts of the query in one pass.
+        self.matcher.FindAllNgrams(self.SyntacticContexts())
+
+    # Returns the normalized contexts of the syntactic left, right and inside
+    # predicates, including linked and excluding predicates.
+    def SyntacticContexts(self):
+        contexts = []
+        for predicate in self.predicates + self.excluding_predicates:
+            while predicate:
+                if predicate.matching == 'syntactic' and \
+                   predicate.type in ['left', 'right', 'inside']:
+                    contexts.append(predicate.normalized_context)
+                predicate = predicate.next
+        return contexts
 
     def PredicateMatchScore(self, mention, predicate):
         span = mention.span
@@ -49,14 +69,16 @@ class Scorer:
             linked_predicate_score = 1
             if predicate.next:
                 linked_predicate_score = self.PredicateMatchScore(mention, predicate.next)
-            return linked_predicate_score * self.ContextMatchScore(span.start,
-                                                                   context, window, -1)
+            return linked_predicate_score * self.ContextMatchScore(
+                span.start, predicate.normalized_context, window, -1)
         elif predicate.type == 'right':
-            return self.ContextMatchScore(span.end, context, window)
+            return self.ContextMatchScore(span.end, predicate.normalized_context, window)
         elif predicate.type == 'inside':
             window = len(span) - len(predicate.context)
-            return 1 if self.ContextMatchScore(span.start, context,
-                                               window, case_sensitive=True) > 0 else 0
+            return 1 if self.ContextMatchScore(span.start, context, window,
+                                               case_sensitive=True,
+                                               normalized_context=predicate.normalized_context) \
+                > 0 else 0
         elif predicate.type == 'substring':
             return span.text.find(predicate.pattern) >= 0
         elif predicate.type == 'match':
@@ -86,40 +108,104 @@ class Scorer:
             mention.score += predicate.weight * predicate_score
             mention.scores.append(predicate_score)
 
+    # Scores the mentions and returns their ScoreMatrix. Each predicate is scored for
+    # all the mentions that are not excluded yet, at once for syntactic left and
+    # right predicates. The mentions share the matrix as their score table.
     def ScoreMentions(self, mentions):
-        for mention in mentions:
-            self.ComputeMentionScore(mention)
-
-    # Aggregates entity scores from mentions scores.
-    # Assummes mention scores have already been populated.
-    def AggregateEntityScores(self, entity):
-        entity.scores = [0 for i in range(self.num_predicates)]
-        for mention in entity.mentions:
-            if mention.score < 0:  # excluded mention
-                return
-            for i in range(self.num_predicates):
-                entity.scores[i] += mention.scores[i]
-
-    def ScoreEntities(self, entities):
-        for entity in entities:
-            self.AggregateEntityScores(entity)
-            entity.score = 0
-            for i in range(self.num_predicates):
-                entity.score += self.predicates[i].weight * entity.scores[i]
-            if entity.score > 1:
-                entity.score = 1
+        starts = numpy.fromiter((m.span.start for m in mentions), dtype=numpy.int64,
+                                count=len(mentions))
+        ends = numpy.fromiter((m.span.end for m in mentions), dtype=numpy.int64,
+                              count=len(mentions))
+        excluded = numpy.zeros(len(mentions), dtype=bool)
+        for predicate in self.excluding_predicates:
+            rows = numpy.flatnonzero(~excluded)
+            excluded[rows] = self.PredicateMatchScores(mentions, starts, ends, rows,
+                                                       predicate) != 0
+        table = numpy.zeros((len(mentions), self.num_predicates))
+        rows = numpy.flatnonzero(~excluded)
+        for i, predicate in enumerate(self.predicates):
+            table[rows, i] = self.PredicateMatchScores(mentions, starts, ends, rows,
+                                                       predicate)
+        matrix = ScoreMatrix([p.weight for p in self.predicates], table, excluded)
+        for k, score in enumerate(matrix.MentionScores().tolist()):
+            mention = mentions[k]
+            mention.score = score
+            if score >= 0:
+                mention.score_table = table
+                mention.row = k
+        return matrix
+
+    # Returns the array of the scores for a predicate of the mentions at the given
+    # rows.
+    def PredicateMatchScores(self, mentions, starts, ends, rows, predicate):
+        scores = self.BatchPredicateMatchScores(starts[rows], ends[rows], predicate)
+        if scores is None:
+            scores = numpy.fromiter((self.PredicateMatchScore(mentions[k], predicate)
+                                     for k in rows.tolist()),
+                                    dtype=numpy.float64, count=len(rows))
+        return scores
+
+    # Returns the array of the scores of the mentions with the given span starts and
+    # ends for a predicate, or None if the predicate is not scored in batch.
+    def BatchPredicateMatchScores(self, starts, ends, predicate):
+        if predicate.matching != 'syntactic':
+            return None
+        if predicate.type == 'left':
+            linked_predicate_scores = 1
+            if predicate.next:
+                linked_predicate_scores = self.BatchPredicateMatchScores(starts, ends,
+                                                                         predicate.next)
+                if linked_predicate_scores is None:
+                    return None
+            return linked_predicate_scores * self.BatchContextMatchScores(
+                starts, predicate.normalized_context, predicate.window, -1)
+        elif predicate.type == 'right':
+            return self.BatchContextMatchScores(ends, predicate.normalized_context,
+                                                predicate.window)
+        return None
 
     # Computes the context match score by looking for matches inside a window.
-    def ContextMatchScore(self, pos, context, window, direction=1, case_sensitive=False):
+    # The context tokens must be normalized, unless matching is case sensitive. For
+    # case sensitive matching, the normalized context can be passed to look up the
+    # candidate positions in the document index.
+    def ContextMatchScore(self, pos, context, window, direction=1, case_sensitive=False,
+                          normalized_context=None):
+        if not case_sensitive:
+            distance = self.matcher.index.NearestOccurrence(pos, context, direction, window)
+            return 1 / (1 + distance) if distance >= 0 else 0
+        if normalized_context and direction > 0:
+            starts = self.matcher.index.FindAllOccurrences(normalized_context)
+            for i in range(bisect_left(starts, pos), len(starts)):
+                distance = starts[i] - pos
+                if distance > window:
+                    break
+                if self.matcher.MatchesNgram(starts[i], context, direction, case_sensitive):
+                    return 1 / (1 + distance)
+            return 0
         for distance in range(window + 1):
             if self.matcher.MatchesNgram(pos + direction * distance, context,
                                          direction, case_sensitive):
                 return 1 / (1 + distance)
         return 0
 
+    # Computes the context match scores for an array of positions, for normalized
+    # context tokens.
+    def BatchContextMatchScores(self, positions, context, window, direction=1):
+        distances = self.matcher.index.NearestOccurrences(positions, context, direction,
+                                                          window)
+        return numpy.where(distances >= 0, 1 / (1 + numpy.maximum(distances, 0)), 0.0)
+
     # Computes the dictionary match score.
     def DictionaryMatchScore(self, span, type_name):
-        if not type_name in self.entity_classifiers:
+        classifier = self.GetEntityClassifier(type_name)
+        if classifier is None:
             return 0
-        return self.entity_classifiers[type_name].is_entity(span.text)
+        return classifier.is_entity(span.text)
+
+    # Returns the classifier of a dictionary, or None if there is none. The registry
+    # is only asked once per scorer, so files are checked for changes once per query.
+    def GetEntityClassifier(self, type_name):
+        if type_name not in self.entity_classifiers:
+            self.entity_classifiers[type_name] = self.dictionaries.Get(type_name)
+        return self.entity_classifiers[type_name]
 
@@ -16,11 +16,84 @@ limitations under the License.
 '''
 
 
+import mmap
+import os
 import string
+from array import array
+import numpy
+
+punctuation = set(string.punctuation) | set(['“', '”', '‘', '’'])
+number_punctuation = set(['.', ','])
+
+# Lookup tables classifying ASCII characters as whitespace, punctuation and digits.
+ascii_space = numpy.array([chr(c).isspace() for c in range(128)])
+ascii_punctuation = numpy.array([chr(c) in punctuation for c in range(128)])
+ascii_digit = numpy.array([chr(c).isdigit() for c in range(128)])
+
+
+# Classifies the characters of text, given as an array of code points, and returns
+# the boolean masks (is_space, is_punctuation, is_digit).
+def classify_characters(code_points):
+    is_ascii = code_points < 128
+    index = numpy.where(is_ascii, code_points, 0)
+    is_space = ascii_space[index]
+    is_punctuation = ascii_punctuation[index]
+    is_digit = ascii_digit[index]
+    if not is_ascii.all():
+        others = numpy.unique(code_points[~is_ascii])
+        chars = [chr(c) for c in others.tolist()]
+        for mask, test in [(is_space, lambda c: c.isspace()),
+                           (is_punctuation, lambda c: c in punctuation),
+                           (is_digit, lambda c: c.isdigit())]:
+            selected = others[numpy.array([test(c) for c in chars], dtype=bool)]
+            if len(selected):
+                mask |= numpy.isin(code_points, selected)
+    return is_space, is_punctuation, is_digit
+
+
+# Returns the UTF-8 byte offset of every position 0..n of an array of n code points.
+def utf8_offsets(code_points):
+    widths = 1 + (code_points >= 0x80).astype(numpy.int64) + \
+        (code_points >= 0x800) + (code_points >= 0x10000)
+    offsets = numpy.zeros(len(code_points) + 1, dtype=numpy.int64)
+    numpy.cumsum(widths, out=offsets[1:])
+    return offsets
+
+
+class MappedText:
+    # Read-only UTF-8 text of a memory-mapped file. Offsets are byte offsets into the
+    # mapped buffer, and slices are decoded on access, so the file is never decoded
+    # as a whole.
+
+    def __init__(self, path):
+        self.path = path
+        self.buffer = b''
+        with open(path, 'rb') as myfile:
+            if os.fstat(myfile.fileno()).st_size:
+                self.buffer = mmap.mmap(myfile.fileno(), 0, access=mmap.ACCESS_READ)
+
+    def __len__(self):
+        return len(self.buffer)
+
+    def __getitem__(self, x):
+        if isinstance(x, slice):
+            return self.buffer[x].decode('utf-8')
+        return self.buffer[x:x + 1].decode('utf-8')
+
+    def __str__(self):
+        return self.buffer[:].decode('utf-8')
+
+    def __getstate__(self):
+        return {'path': self.path}
+
+    def __setstate__(self, state):
+        self.__init__(state['path'])
 
 
 class Segment:
 
+    __slots__ = ('row', 'col', 'start', 'end', 'text', 'append_to_previous')
+
     def __init__(self, text, row, col, start, end, append_to_previous):
         self.row = row
         self.col = col
@@ -34,20 +107,173 @@ class Segment:
                                                            self.start, self.end, self.text)
 
 
+class SegmentStore:
+    # Compact, array-backed list of segments. Offsets, rows, columns and flags are
+    # kept in typed arrays; Segment objects are only created on access.
+
+    def __init__(self, text):
+        self.text = text
+        self.starts = array('q')
+        self.ends = array('q')
+        self.rows = array('i')
+        self.cols = array('i')
+        self.flags = array('b')
+
+    def append(self, row, col, start, end, append_to_previous):
+        self.flags.append(1 if append_to_previous else 0)
+        self.starts.append(start)
+        self.ends.append(end)
+        self.rows.append(row)
+        self.cols.append(col)
+
+    def extend(self, rows, cols, starts, ends, flags):
+        self.flags.frombytes(numpy.asarray(flags, dtype=numpy.int8).tobytes())
+        self.starts.frombytes(numpy.asarray(starts, dtype=numpy.int64).tobytes())
+        self.ends.frombytes(numpy.asarray(ends, dtype=numpy.int64).tobytes())
+        self.rows.frombytes(numpy.asarray(rows, dtype=numpy.int32).tobytes())
+        self.cols.frombytes(numpy.asarray(cols, dtype=numpy.int32).tobytes())
+
+    def __len__(self):
+        return len(self.starts)
+
+    # Returns an iterator over the segment texts, without creating Segments.
+    def Texts(self):
+        text = self.text
+        return (text[start:end] for start, end in zip(self.starts, self.ends))
+
+    def __iter__(self):
+        for i in range(len(self.starts)):
+            yield self.Get(i)
+
+    def __getitem__(self, x):
+        if isinstance(x, slice):
+            return [self.Get(i) for i in range(*x.indices(len(self.starts)))]
+        if x < 0:
+            x += len(self.starts)
+        if x < 0 or x >= len(self.starts):
+            raise IndexError('segment index out of range')
+        return self.Get(x)
+
+    def Get(self, i):
+        return Segment(self.text, self.rows[i], self.cols[i], self.starts[i],
+                       self.ends[i], self.flags[i] == 1)
+
+
 class Segmenter:
 
+    # Segmentation engine used by Segment: 'vectorized' or 'characters'.
+    engine = 'vectorized'
+
     def __init__(self):
         pass
 
     @staticmethod
-    def Segment(text):
-        segments = []
+    def Segment(text, engine=None):
+        if isinstance(text, MappedText):
+            return Segmenter.SegmentMapped(text)
+        if (engine or Segmenter.engine) == 'characters':
+            return Segmenter.SegmentCharacters(text)
+        return Segmenter.SegmentVectorized(text)
+
+    @staticmethod
+    def SegmentVectorized(text):
+        segments = SegmentStore(text)
+        Segmenter.AppendSegments(segments, text)
+        return segments
+
+    # Segments a memory-mapped text incrementally. The buffer is decoded one block of
+    # whole lines at a time, and segment offsets are byte offsets into the buffer.
+    @staticmethod
+    def SegmentMapped(text, block_size=1 << 22):
+        segments = SegmentStore(text)
+        buffer = text.buffer
+        row = 0
+        block_start = 0
+        while block_start < len(buffer):
+            block_end = len(buffer)
+            if block_start + block_size < block_end:
+                # Cut after the last line feed of the block, or the first one after it.
+                block_end = buffer.rfind(b'\n', block_start, block_start + block_size) + 1
+                if block_end == 0:
+                    block_end = buffer.find(b'\n', block_start + block_size) + 1 or \
+                                len(buffer)
+            block = buffer[block_start:block_end].decode('utf-8')
+            row = Segmenter.AppendSegments(segments, block, row, block_start,
+                                           byte_offsets=True)
+            block_start = block_end
+        return segments
+
+    # Segments text with array operations over its code points, and appends the
+    # segments to the store. The first line of text is numbered row + 1 and starts
+    # at offset `offset`. Offsets are character offsets, or UTF-8 byte offsets if
+    # byte_offsets is set; columns are always character columns. Text is processed
+    # in blocks of whole lines to bound the size of the temporary arrays. Returns the
+    # number of the last row.
+    @staticmethod
+    def AppendSegments(segments, text, row=0, offset=0, byte_offsets=False,
+                       block_size=1 << 20):
+        lines = text.splitlines(True)
+        if not lines:
+            return row
+        line_starts = numpy.zeros(len(lines) + 1, dtype=numpy.int64)
+        numpy.cumsum(numpy.fromiter(map(len, lines), dtype=numpy.int64, count=len(lines)),
+                     out=line_starts[1:])
+        first_line = 0
+        while first_line < len(lines):
+            last_line = int(numpy.searchsorted(line_starts,
+                                               line_starts[first_line] + block_size,
+                                               side='right')) - 1
+            last_line = min(max(last_line, first_line + 1), len(lines))
+            block_start = int(line_starts[first_line])
+            block = text[block_start:int(line_starts[last_line])]
+            code_points = numpy.frombuffer(block.encode('utf-32-le'), dtype=numpy.uint32)
+            starts, ends = Segmenter.SegmentBoundaries(code_points)
+            line_index = numpy.searchsorted(line_starts, starts + block_start,
+                                            side='right') - 1
+            cols = starts + block_start - line_starts[line_index]
+            block_length = len(block)
+            if byte_offsets and numpy.any(code_points >= 0x80):
+                positions = utf8_offsets(code_points)
+                starts = positions[starts]
+                ends = positions[ends]
+                block_length = int(positions[-1])
+            starts += offset
+            ends += offset
+            flags = numpy.empty(len(starts), dtype=bool)
+            if len(starts):
+                flags[0] = bool(segments) and starts[0] == segments.ends[-1]
+                flags[1:] = starts[1:] == ends[:-1]
+            segments.extend(row + 1 + line_index, cols, starts, ends, flags)
+            offset += block_length
+            first_line = last_line
+        return row + len(lines)
+
+    # Returns the start and end offsets of the segments of a text, given as an array
+    # of code points.
+    @staticmethod
+    def SegmentBoundaries(code_points):
+        is_space, is_punctuation, is_digit = classify_characters(code_points)
+        # '.' and ',' between two digits belong to the surrounding number.
+        is_number_punctuation = numpy.isin(code_points,
+                                           [ord(c) for c in number_punctuation])
+        is_punctuation[1:-1] &= ~(is_number_punctuation[1:-1] &
+                                  is_digit[:-2] & is_digit[2:])
+        in_word = ~(is_space | is_punctuation)
+        word_start = in_word.copy()
+        word_start[1:] &= ~in_word[:-1]
+        word_end = in_word.copy()
+        word_end[:-1] &= ~in_word[1:]
+        starts = numpy.flatnonzero(word_start | is_punctuation)
+        ends = numpy.flatnonzero(word_end | is_punctuation) + 1
+        return starts, ends
+
+    # Reference engine walking the text one character at a time.
+    @staticmethod
+    def SegmentCharacters(text):
+        segments = SegmentStore(text)
         in_segment = False
         lines = text.splitlines(True)
         row = 0
-        punctuation = set(string.punctuation) | \
-                      set(['“', '”', '‘', '’'])
-        number_punctuation = set(['.', ','])
         line_start = 0
         n = 0
         for i in range(len(lines)):
@@ -60,11 +286,9 @@ class Segmenter:
             for j in range(n):
                 c = line[j]
                 if c.isspace() and in_segment:
-                    append_to_previous = segments and segments[-1].end == line_start + col
-                    segments.append(
-                        Segment(text, row, col, line_start + col, line_start + j,
-                                append_to_previous))
-                    append_to_previous = False
+                    append_to_previous = segments and segments.ends[-1] == line_start + col
+                    segments.append(row, col, line_start + col, line_start + j,
+                                    append_to_previous)
                     in_segment = False
                 elif (j > 0 and line[j - 1].isdigit() and
                       c in number_punctuation and
@@ -74,15 +298,13 @@ class Segmenter:
                     if in_segment:
                         # terminate current segment
                         in_segment = False
-                        append_to_previous = segments and segments[-1].end == line_start + col
-                        segments.append(
-                            Segment(text, row, col, line_start + col, line_start + j,
-                                    append_to_previous))
+                        append_to_previous = segments and segments.ends[-1] == line_start + col
+                        segments.append(row, col, line_start + col, line_start + j,
+                                        append_to_previous)
                     # create new segment with the punctuation character
-                    append_to_previous = segments and segments[-1].end == line_start + j
-                    segments.append(
-                        Segment(text, row, j, line_start + j, line_start + j + 1,
-                                    append_to_previous))
+                    append_to_previous = segments and segments.ends[-1] == line_start + j
+                    segments.append(row, j, line_start + j, line_start + j + 1,
+                                    append_to_previous)
                     in_segment = False
                 elif not c.isspace() and not in_segment:
                     # mark start of new segment
@@ -90,47 +312,111 @@ class Segmenter:
                     col = j
                     in_segment = True
         if in_segment:
-            append_to_previous = segments and segments[-1].end == line_start + col
-            segments.append(
-                Segment(text, row, col, line_start + col, line_start + j + 1,
-                        append_to_previous))
+            append_to_previous = segments and segments.ends[-1] == line_start + col
+            segments.append(row, col, line_start + col, line_start + j + 1,
+                            append_to_previous)
         return segments
 
 
 class SegmentedSpan:
+    # Lightweight view of the segments [start, end) of a document. Row, column,
+    # character offsets, text and segments are read from the document on access.
+
+    __slots__ = ('doc', 'start', 'end', 'type', 'syntax_type')
 
     def __init__(self, doc, start, end, syntax_type=''):
-        assert(start < len(doc) and start >= 0 and
-               end <= len(doc) and end >= 0), \
-               "Span %d:%d is out of the document range 0:%d." % (start, end, len(doc))
+        n = len(doc)
+        assert(start < n and start >= 0 and end <= n and end >= 0), \
+               "Span %d:%d is out of the document range 0:%d." % (start, end, n)
         self.doc = doc
         self.start = start
         self.end = end
-        first_segment = doc.segments[start]
-        last_segment = doc.segments[end - 1]
-        self.row = first_segment.row
-        self.col = first_segment.col
-        self.start_char = first_segment.start
-        self.end_char = last_segment.end
-        self.segments = doc.segments[start:end]
-        self.text = doc.text[first_segment.start:last_segment.end]
         self.type = "text"
         self.syntax_type = syntax_type
 
+    @property
+    def row(self):
+        return self.doc.segments.rows[self.start]
+
+    @property
+    def col(self):
+        return self.doc.segments.cols[self.start]
+
+    @property
+    def start_char(self):
+        return self.doc.segments.starts[self.start]
+
+    @property
+    def end_char(self):
+        return self.doc.segments.ends[self.end - 1]
+
+    @property
+    def text(self):
+        segments = self.doc.segments
+        return self.doc.text[segments.starts[self.start]:segments.ends[self.end - 1]]
+
+    @property
+    def segments(self):
+        return self.doc.segments[self.start:self.end]
+
+    # The state of a span, as pickled and serialized (e.g. by jsonpickle), holds the
+    # fields read from the document too.
+    def __getstate__(self):
+        return {'doc': self.doc, 'start': self.start, 'end': self.end,
+                'row': int(self.row), 'col': int(self.col),
+                'start_char': int(self.start_char), 'end_char': int(self.end_char),
+                'segments': self.segments, 'text': self.text, 'type': self.type,
+                'syntax_type': self.syntax_type}
+
+    def __setstate__(self, state):
+        for attr in self.__slots__:
+            setattr(self, attr, state[attr])
+
     def __len__(self):
         return self.end - self.start
 
+    def __iter__(self):
+        segments = self.doc.segments
+        for i in range(self.start, self.end):
+            yield segments.Get(i)
+
     def __getitem__(self, x):
         if isinstance(x, slice):
             return SegmentedSpan(self.doc, self.start + x.start, self.start + x.stop)
-        return self.segments[x]
+        if x < 0:
+            x += self.end - self.start
+        if x < 0 or x >= self.end - self.start:
+            raise IndexError('segment index out of range')
+        return self.doc.segments.Get(self.start + x)
+
+
+class SpanList:
+    # Sequence of the spans [starts[i], ends[i]) of a document, kept as two arrays of
+    # token positions. Spans are created on access.
+
+    def __init__(self, doc, starts, ends):
+        self.doc = doc
+        self.starts = starts
+        self.ends = ends
+
+    def __len__(self):
+        return len(self.starts)
+
+    def __iter__(self):
+        for i in range(len(self.starts)):
+            yield SegmentedSpan(self.doc, self.starts[i], self.ends[i])
+
+    def __getitem__(self, x):
+        if isinstance(x, slice):
+            return [self[i] for i in range(*x.indices(len(self.starts)))]
+        return SegmentedSpan(self.doc, self.starts[x], self.ends[x])
 
 
 class SegmentedDocument:
 
-    def __init__(self, text):
+    def __init__(self, text, segments=None):
         self.text = text
-        self.segments = Segmenter.Segment(self.text)
+        self.segments = segments if segments is not None else Segmenter.Segment(self.text)
 
     def __len__(self):
         return len(self.segments)
@@ -138,4 +424,16 @@ class SegmentedDocument:
     def __getitem__(self, x):
         if isinstance(x, slice):
             return SegmentedSpan(self, x.start, x.stop)
-        return SegmentedSpan(self, x, x + 1)[0]
+        return self.segments[x]
+
+    # Returns an iterator over the token texts, without creating Segments.
+    def TokenTexts(self):
+        if isinstance(self.segments, SegmentStore):
+            return self.segments.Texts()
+        return (segment.text for segment in self.segments)
+
+    # Returns the array of the token rows.
+    def TokenRows(self):
+        if isinstance(self.segments, SegmentStore):
+            return numpy.frombuffer(self.segments.rows, dtype=numpy.int32)
+        return numpy.array([segment.row for segment in self.segments], dtype=numpy.int32)
@@ -14,31 +14,38 @@ See the License for the specific language governing permissions and
 limitations under the License.
 '''
 
-from .matcher import Matcher, Ngram
+from .matcher import Matcher, Ngram, get_token_ids
 from .sentence_decomposer import SentenceDecomposer
+from .sentence_table import get_sentence_table
+from .vocabulary import TokenIdSet, vocabulary
 
 class SemanticScorer(object):
 
-    def __init__(self, doc, sentence_decomposer_server_url = ''):
+    def __init__(self, doc, sentence_decomposer_server_url = '', matcher=None):
         self.doc = doc
-        self.sentence_wordsets = []
-        self.sentences = []
-        self.entailed_sentences = []
+        self.matcher = matcher if matcher is not None else Matcher(doc)
+        self.sentence_table = get_sentence_table(doc)
+        self.sentence_wordsets = {}  # built on demand
+        self.entailed_sentences = [[] for i in range(len(self.sentence_table))]
         self.sentence_decomposer_server_url = sentence_decomposer_server_url
-        for sent in doc.sents:
-            wordset = set()
-            for word in sent:
-                wordset.add(word.text.lower())
-            self.sentence_wordsets.append(wordset)
-            self.sentences.append(sent)
-            self.entailed_sentences.append([])
+
+    # Returns the set of the token ids of a sentence.
+    def SentenceWordset(self, sentence_index):
+        wordset = self.sentence_wordsets.get(sentence_index)
+        if wordset is None:
+            table = self.sentence_table
+            wordset = TokenIdSet(get_token_ids(self.doc)[table.start_list[sentence_index]:
+                                                         table.end_list[sentence_index]])
+            self.sentence_wordsets[sentence_index] = wordset
+        return wordset
 
     def PruneExpandedQueries(self, sentence_index, expanded_queries):
         valid_expanded_queries = []
+        wordset = self.SentenceWordset(sentence_index)
         for (expanded_tokens, query_score) in expanded_queries:
             valid = True
             for token in expanded_tokens:
-                if token not in self.sentence_wordsets[sentence_index]:
+                if token not in wordset:
                     valid = False
                     break
             if valid:
@@ -55,13 +62,14 @@ class SemanticScorer(object):
             return 0.0
         
         if predicate.type == 'inside':
-            matcher = Matcher(self.doc)
+            matcher = self.matcher
             for (expanded_tokens, query_score) in valid_expanded_queries:
                 if query_score <= maximum_score:
                     continue
+                normalized_tokens = [vocabulary.TokenId(t) for t in expanded_tokens]
                 for pos in range(mention.span.start, \
                                  mention.span.end - len(expanded_tokens) + 1):
-                    if matcher.MatchesNgram(pos, expanded_tokens):
+                    if matcher.MatchesNormalizedNgram(pos, normalized_tokens):
                         maximum_score = query_score
             return maximum_score
         elif predicate.type == 'substring':
@@ -76,7 +84,7 @@ class SemanticScorer(object):
         entailed_sentences = self.entailed_sentences[sentence_index]  # look up in cache
         if not entailed_sentences:
             # lazy decomposition
-            sentence = self.sentences[sentence_index]
+            sentence = self.sentence_table.Sentence(sentence_index)
             # print('Requesting entailed sentences for: %s' % sentence)
             
             decomposer = SentenceDecomposer(self.sentence_decomposer_server_url)
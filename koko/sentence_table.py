@@ -0,0 +1,86 @@
+'''
+Copyright 2017 Recruit Institute of Technology
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+     http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+'''
+
+from bisect import bisect_left, bisect_right
+import numpy
+from .segmenter import SpanList
+
+
+class SentenceTable:
+    # Sentence lookup table of a document: the start and end token positions of its
+    # sentences, which must be sorted and not overlap, and the index of the sentence
+    # of every token (-1 for tokens outside sentences).
+
+    def __init__(self, doc):
+        if isinstance(doc.sents, (SpanList, list)):
+            self.sents = doc.sents
+        else:
+            self.sents = list(doc.sents)
+        if isinstance(self.sents, SpanList):
+            self.starts = numpy.asarray(self.sents.starts, dtype=numpy.int64)
+            self.ends = numpy.asarray(self.sents.ends, dtype=numpy.int64)
+        else:
+            self.starts = numpy.array([sent.start for sent in self.sents], dtype=numpy.int64)
+            self.ends = numpy.array([sent.end for sent in self.sents], dtype=numpy.int64)
+        self.token_sentences = numpy.full(len(doc), -1, dtype=numpy.int64)
+        lengths = self.ends - self.starts
+        offsets = numpy.cumsum(lengths) - lengths  # of each sentence in their concatenation
+        positions = numpy.arange(lengths.sum()) + numpy.repeat(self.starts - offsets, lengths)
+        self.token_sentences[positions] = numpy.repeat(numpy.arange(len(lengths)), lengths)
+        self.start_list = self.starts.tolist()
+        self.end_list = self.ends.tolist()
+
+    def __len__(self):
+        return len(self.start_list)
+
+    def Sentence(self, si):
+        return self.sents[si]
+
+    # Returns the index of the sentence of the token at pos, or -1.
+    def SentenceOf(self, pos):
+        return int(self.token_sentences[pos]) if 0 <= pos < len(self.token_sentences) \
+            else -1
+
+    # Returns the index of the first sentence containing the span [start, end), or -1.
+    def SpanSentence(self, start, end):
+        if start < end:
+            si = self.SentenceOf(start)
+            return si if si >= 0 and end <= self.end_list[si] else -1
+        si = bisect_left(self.end_list, end)
+        return si if si < bisect_right(self.start_list, start) else -1
+
+    # Returns, for the spans with the given arrays of starts and ends, the array of
+    # the indices of the first sentences ending after the spans start, or -1 for the
+    # spans that do not end within those sentences.
+    def JoinSpans(self, starts, ends):
+        si = numpy.searchsorted(self.ends, starts, side='right')
+        inside = si < len(self.ends)
+        inside[inside] = ends[inside] <= self.ends[si[inside]]
+        return numpy.where(inside, si, -1)
+
+
+# Returns the sentence table of doc. The table is built once per document and kept
+# on the document when it accepts new attributes.
+def get_sentence_table(doc):
+    table = getattr(doc, 'sentence_table', None)
+    if table is not None:
+        return table
+    table = SentenceTable(doc)
+    try:
+        doc.sentence_table = table
+    except AttributeError:
+        pass
+    return table
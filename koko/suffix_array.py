@@ -0,0 +1,114 @@
+'''
+Copyright 2017 Recruit Institute of Technology
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+     http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+'''
+
+import numpy
+
+
+# Sorts the suffixes of an integer sequence by prefix doubling. Returns the suffix
+# array and the rank arrays of every round: ranks[j][i] orders the suffix at i by
+# its first 2^j ids, with suffixes shorter than 2^j ids ordered as if padded with -1.
+def sort_suffixes(ids):
+    n = len(ids)
+    rank = numpy.unique(ids, return_inverse=True)[1].astype(numpy.int32)
+    order = numpy.argsort(rank, kind='stable')
+    ranks = [rank]
+    k = 1
+    while k < n and rank[order[-1]] < n - 1:
+        second = numpy.full(n, -1, dtype=numpy.int32)
+        second[:n - k] = rank[k:]
+        order = numpy.lexsort((second, rank))
+        first, second = rank[order], second[order]
+        changed = (first[1:] != first[:-1]) | (second[1:] != second[:-1])
+        rank = numpy.empty(n, dtype=numpy.int32)
+        rank[order[0]] = 0
+        rank[order[1:]] = numpy.cumsum(changed)
+        ranks.append(rank)
+        k *= 2
+    return order, ranks
+
+
+# Returns lcp[i], the length of the longest common prefix of the suffixes at sa[i]
+# and sa[i + 1], by binary lifting over the rank arrays of sort_suffixes.
+def longest_common_prefixes(sa, ranks):
+    n = len(sa)
+    a, b = sa[:-1], sa[1:]
+    lcp = numpy.zeros(max(n - 1, 0), dtype=numpy.int64)
+    for j in reversed(range(len(ranks))):
+        i, k = a + lcp, b + lcp
+        same = (i < n) & (k < n)
+        same[same] = ranks[j][i[same]] == ranks[j][k[same]]
+        lcp[same] += 1 << j
+    return lcp
+
+
+class SuffixArray:
+    # Suffix array with LCP over the token ids of a document. Every occurrence of an
+    # n-gram of m tokens is found in O(m log n) time.
+
+    def __init__(self, token_ids):
+        self.token_ids = numpy.asarray(token_ids, dtype=numpy.int64)
+        sa, ranks = sort_suffixes(self.token_ids)
+        self.lcp = longest_common_prefixes(sa, ranks)
+        self.rank = ranks[-1]  # inverse of sa
+        self.sa = sa
+
+    def __len__(self):
+        return len(self.sa)
+
+    # Returns the range [lo, hi) of the suffix array holding the suffixes that
+    # start with the ngram of token ids.
+    def Find(self, ngram):
+        pattern = list(ngram)
+        m = len(pattern)
+        ids = self.token_ids
+        sa = self.sa
+        lo, hi = 0, len(sa)
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if ids[sa[mid]:sa[mid] + m].tolist() < pattern:
+                lo = mid + 1
+            else:
+                hi = mid
+        start = lo
+        hi = len(sa)
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if ids[sa[mid]:sa[mid] + m].tolist() <= pattern:
+                lo = mid + 1
+            else:
+                hi = mid
+        return start, lo
+
+    # Returns the sorted start positions of all occurrences of the ngram of token ids.
+    def Occurrences(self, ngram):
+        lo, hi = self.Find(ngram)
+        return numpy.sort(self.sa[lo:hi]).tolist()
+
+    # Returns the range [lo, hi) of the suffix array holding the suffixes that
+    # share their first m tokens with the suffix at pos, using the LCP array.
+    def RangeAt(self, pos, m):
+        lcp = self.lcp
+        lo = hi = int(self.rank[pos])
+        while lo > 0 and lcp[lo - 1] >= m:
+            lo -= 1
+        while hi < len(lcp) and lcp[hi] >= m:
+            hi += 1
+        return lo, hi + 1
+
+    # Returns the sorted start positions of all occurrences of the m tokens at pos.
+    def OccurrencesAt(self, pos, m):
+        lo, hi = self.RangeAt(pos, m)
+        return numpy.sort(self.sa[lo:hi]).tolist()
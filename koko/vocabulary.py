@@ -0,0 +1,106 @@
+'''
+Copyright 2017 Recruit Institute of Technology
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+     http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+'''
+
+import numpy
+from unidecode import unidecode
+
+
+# Case- and accent-insensitive form of a token, used for matching.
+def normalize_token(text):
+    return unidecode(text).lower()
+
+
+class Vocabulary:
+    # Interned vocabulary mapping normalized token strings to integer ids. Ids are
+    # assigned in insertion order, so a vocabulary rebuilt from the words of another
+    # one (e.g. when unpickled in a worker process) assigns the same ids.
+
+    def __init__(self, words=()):
+        self.words = []
+        self.ids = {}
+        self.text_ids = {}  # raw token text -> id of its normalized form
+        self.Update(words)
+
+    def __len__(self):
+        return len(self.words)
+
+    def __getstate__(self):
+        return self.words
+
+    def __setstate__(self, words):
+        self.__init__(words)
+
+    # Adds the given normalized words, in order.
+    def Update(self, words):
+        for word in words:
+            self.Id(word)
+
+    # Returns the id of a normalized word, adding it if needed.
+    def Id(self, word):
+        i = self.ids.get(word)
+        if i is None:
+            i = self.ids[word] = len(self.words)
+            self.words.append(word)
+        return i
+
+    # Returns the id of a normalized word, or -1 if it is not in the vocabulary.
+    def Lookup(self, word):
+        return self.ids.get(word, -1)
+
+    def Word(self, i):
+        return self.words[i]
+
+    # Returns the id of the normalized form of a token, adding it if needed. Each
+    # distinct token text is normalized only once.
+    def TokenId(self, text):
+        i = self.text_ids.get(text)
+        if i is None:
+            i = self.text_ids[text] = self.Id(normalize_token(text))
+        return i
+
+    # Returns the id of the normalized form of a token, or -1 if it is not in the
+    # vocabulary.
+    def LookupToken(self, text):
+        i = self.text_ids.get(text)
+        return i if i is not None else self.Lookup(normalize_token(text))
+
+    # Returns the int32 array of the ids of the normalized forms of the tokens.
+    def TokenIds(self, texts, count=-1):
+        return numpy.fromiter((self.TokenId(text) for text in texts),
+                              dtype=numpy.int32, count=count)
+
+
+# The vocabulary shared by all the documents of the process.
+vocabulary = Vocabulary()
+
+
+class TokenIdSet:
+    # Set of token ids. Membership can be tested with ids or with token texts, which
+    # are normalized first.
+
+    def __init__(self, ids=()):
+        self.ids = set(numpy.unique(numpy.asarray(ids, dtype=numpy.int64)).tolist())
+
+    def __contains__(self, token):
+        if isinstance(token, str):
+            token = vocabulary.LookupToken(token)
+        return token in self.ids
+
+    def __len__(self):
+        return len(self.ids)
+
+    def __iter__(self):
+        return (vocabulary.Word(i) for i in self.ids)
@@ -0,0 +1,51 @@
+'''
+Copyright 2017 Recruit Institute of Technology
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+     http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+'''
+
+import random
+import unittest
+from koko.context_matcher import ContextMatcher
+from koko.document_index import DocumentIndex
+
+
+class ContextMatcherTestCase(unittest.TestCase):
+
+    def test_overlapping_ngrams(self):
+        tokens = 'a b a b c a b x b c'.split()
+        ngrams = [('a', 'b'), ('b', 'c'), ('a', 'b', 'c'), ('b',), ('c', 'a')]
+        hits = ContextMatcher(ngrams).FindAll(tokens)
+        self.assertEqual(hits[('a', 'b')], [0, 2, 5])
+        self.assertEqual(hits[('b', 'c')], [3, 8])
+        self.assertEqual(hits[('a', 'b', 'c')], [2])
+        self.assertEqual(hits[('b',)], [1, 3, 6, 8])
+        self.assertEqual(hits[('c', 'a')], [4])
+
+    def test_matches_brute_force(self):
+        rng = random.Random(7)
+        tokens = [rng.randrange(6) for i in range(500)]
+        ngrams = set(tuple(rng.randrange(4) for i in range(rng.randint(1, 4)))
+                     for j in range(30))
+        matcher = ContextMatcher(ngrams)
+        for hits in [matcher.FindAll(tokens),
+                     matcher.FindAll(tokens, DocumentIndex(tokens))]:
+            for ngram in ngrams:
+                n = len(ngram)
+                expected = [i for i in range(len(tokens) - n + 1)
+                            if tuple(tokens[i:i + n]) == ngram]
+                self.assertEqual(hits[ngram], expected)
+
+
+if __name__ == '__main__':
+    unittest.main()
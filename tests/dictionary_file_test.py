@@ -0,0 +1,93 @@
+'''
+Copyright 2017 Recruit Institute of Technology
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+     http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+'''
+
+import os
+import shutil
+import tempfile
+import unittest
+from koko.dictionary_file import CompiledDictionary, is_compiled_dictionary, \
+    read_text_dictionary, write_compiled_dictionary
+from koko.entity_classifier import DictionaryRegistry
+from koko.matcher import Matcher
+from koko.test_document import TestDocument
+
+
+class DictionaryFileTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.dict_dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.dict_dir)
+
+    def Path(self, name):
+        return os.path.join(self.dict_dir, name)
+
+    def Write(self, name, text):
+        with open(self.Path(name), 'w') as myfile:
+            myfile.write(text)
+
+    def test_lookups(self):
+        entries = ['Philz Coffee', 'Cafe Benz', 'Café Benz', 'Blue Bottle', 'Cafe Benz']
+        write_compiled_dictionary(self.Path('Cafe.kdict'), [(e, 1) for e in entries])
+        self.assertTrue(is_compiled_dictionary(self.Path('Cafe.kdict')))
+        cafe = CompiledDictionary(self.Path('Cafe.kdict'))
+        self.assertEqual(len(cafe), 4)
+        self.assertEqual(list(cafe), ['Blue Bottle', 'Cafe Benz', 'Café Benz',
+                                      'Philz Coffee'])
+        for entry in entries:
+            self.assertIn(entry, cafe)
+            self.assertEqual(cafe[entry], 1)
+        for name in ['', 'Cafe', 'Cafe Benz ', 'cafe benz', 'Zebra', 'A']:
+            self.assertNotIn(name, cafe)
+            self.assertEqual(cafe.get(name, 0.0), 0.0)
+        self.assertRaises(KeyError, lambda: cafe['Cafe'])
+
+    def test_weights(self):
+        self.Write('Cafe.txt', 'Cafe Benz\t0.5\nPhilz Coffee\t2\nCafe Benz\t0.25\n')
+        write_compiled_dictionary(self.Path('Cafe.kdict'),
+                                  read_text_dictionary(self.Path('Cafe.txt'), True), True)
+        cafe = CompiledDictionary(self.Path('Cafe.kdict'))
+        self.assertEqual(dict((entry, cafe[entry]) for entry in cafe),
+                         {'Cafe Benz': 0.25, 'Philz Coffee': 2.0})
+
+    def test_empty(self):
+        write_compiled_dictionary(self.Path('Cafe.kdict'), [])
+        cafe = CompiledDictionary(self.Path('Cafe.kdict'))
+        self.assertEqual(len(cafe), 0)
+        self.assertNotIn('Cafe Benz', cafe)
+
+    def test_invalid(self):
+        self.Write('Cafe.txt', 'Cafe Benz\nPhilz Coffee\n' * 4)
+        self.assertFalse(is_compiled_dictionary(self.Path('Cafe.txt')))
+        self.assertRaises(ValueError, CompiledDictionary, self.Path('Cafe.txt'))
+
+    def test_registry(self):
+        self.Write('Cafe', 'Cafe Benz\nPhilz Coffee\n')
+        registry = DictionaryRegistry(self.dict_dir)
+        self.assertEqual(registry.Path('Cafe'), self.Path('Cafe'))
+        write_compiled_dictionary(self.Path('Cafe.kdict'),
+                                  read_text_dictionary(self.Path('Cafe')))
+        self.assertEqual(registry.Path('Cafe'), self.Path('Cafe.kdict'))
+        cafe = registry.Get('Cafe')
+        self.assertIsInstance(cafe.dictionary, CompiledDictionary)
+        self.assertEqual(cafe.is_entity('Cafe Benz'), 1)
+        self.assertEqual(cafe.is_entity('Cafe'), 0)
+        doc = TestDocument('I like Philz Coffee and cafe benz.')
+        self.assertEqual(cafe.FindEntries(Matcher(doc).tokens), [(2, 4), (5, 7)])
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,79 @@
+'''
+Copyright 2017 Recruit Institute of Technology
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+     http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+'''
+
+import os
+import shutil
+import tempfile
+import unittest
+from koko import document_cache
+from koko.document_cache import DocumentCache
+from koko.segmenter import MappedText
+
+
+class DocumentCacheTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.cache_dir = tempfile.mkdtemp()
+        self.cache = DocumentCache(self.cache_dir)
+        self.text = 'Café Benz opened in 1998.\nIt serves Philz Coffee and tea.\n'
+
+    def tearDown(self):
+        shutil.rmtree(self.cache_dir)
+
+    def AssertSameDocument(self, doc, expected):
+        self.assertEqual([s.text for s in doc.segments],
+                         [s.text for s in expected.segments])
+        self.assertEqual(list(doc.segments.rows), list(expected.segments.rows))
+        self.assertEqual(list(doc.segments.cols), list(expected.segments.cols))
+        self.assertEqual(list(doc.segments.flags), list(expected.segments.flags))
+        self.assertEqual([s.text for s in doc.sents], [s.text for s in expected.sents])
+        self.assertEqual([s.text for s in doc.ents], [s.text for s in expected.ents])
+
+    def test_round_trip(self):
+        self.assertIsNone(self.cache.Load(self.text))
+        doc = self.cache.GetDocument(self.text)
+        self.assertTrue(os.path.exists(self.cache.Path(self.cache.ContentHash(self.text))))
+        cached = self.cache.Load(self.text)
+        self.assertIsNotNone(cached)
+        self.AssertSameDocument(cached, doc)
+        self.assertEqual([e.text for e in cached.ents], ['Café Benz', 'It', 'Philz Coffee'])
+
+    def test_mapped_text(self):
+        path = os.path.join(self.cache_dir, 'doc.txt')
+        with open(path, 'wb') as myfile:
+            myfile.write(self.text.encode('utf-8'))
+        mapped = MappedText(path)
+        doc = self.cache.GetDocument(mapped)
+        cached = self.cache.Load(mapped)
+        self.AssertSameDocument(cached, doc)
+        self.AssertSameDocument(cached, self.cache.GetDocument(self.text))
+        # Byte offsets of a mapped document are never reused for a str document.
+        self.cache.Save(doc, self.cache.ContentHash(self.text))
+        self.assertIsNone(self.cache.Load(self.text))
+
+    def test_stale_version(self):
+        self.assertIsNotNone(self.cache.GetDocument(self.text))
+        self.assertIsNotNone(self.cache.Load(self.text))
+        version = document_cache.FORMAT_VERSION
+        document_cache.FORMAT_VERSION = version + 1
+        try:
+            self.assertIsNone(self.cache.Load(self.text))
+        finally:
+            document_cache.FORMAT_VERSION = version
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,95 @@
+'''
+Copyright 2017 Recruit Institute of Technology
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+     http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+'''
+
+import unittest
+from koko.matcher import Matcher
+from koko.test_document import TestDocument
+from koko.vocabulary import vocabulary
+
+
+class DocumentIndexTestCase(unittest.TestCase):
+
+    def setUp(self):
+        #                        0    1  2    3   45 6    7       8   9 10   11
+        self.doc = TestDocument('This is Cafe Benz, a full service cafe. This cafe '
+        #                        12 13   14
+                                'is great.')
+        self.matcher = Matcher(self.doc)
+        self.index = self.matcher.index
+
+    def ids(self, words):
+        return [vocabulary.Id(word) for word in words]
+
+    def test_postings(self):
+        self.assertEqual(self.index.Postings(vocabulary.Id('cafe')).tolist(), [2, 8, 11])
+        self.assertEqual(self.index.Postings(vocabulary.Id('this')).tolist(), [0, 10])
+        self.assertEqual(self.index.Postings(vocabulary.Id('tea')).tolist(), [])
+
+    def test_find_all_occurrences(self):
+        self.assertEqual(self.index.FindAllOccurrences(self.ids(['cafe'])), [2, 8, 11])
+        self.assertEqual(self.index.FindAllOccurrences(self.ids(['this', 'cafe'])), [10])
+        self.assertEqual(self.index.FindAllOccurrences(self.ids(['cafe', '.'])), [8])
+        self.assertEqual(self.index.FindAllOccurrences(self.ids(['cafe', 'tea'])), [])
+        self.assertEqual(self.matcher.FindAllOccurrences(['CAFE', 'Benz']), [2])
+
+    def test_find_ngram(self):
+        self.assertEqual(self.index.FindNgram(self.ids(['cafe', 'is'])), (11, 13))
+        self.assertEqual(self.index.FindNgram(self.ids(['tea'])), (0, 0))
+
+    def test_nearest_occurrence(self):
+        self.assertEqual(self.index.NearestOccurrence(4, self.ids(['a', 'full']), 1, 10), 1)
+        self.assertEqual(self.index.NearestOccurrence(4, self.ids(['a', 'full']), 1, 0), -1)
+        self.assertEqual(self.index.NearestOccurrence(2, self.ids(['this', 'is']), -1), 0)
+        self.assertEqual(self.index.NearestOccurrence(4, self.ids(['this', 'is']), -1, 1), -1)
+        self.assertEqual(self.index.NearestOccurrence(4, self.ids(['this', 'is']), -1, 2), 2)
+
+    def test_hit_mask(self):
+        self.assertEqual(self.index.HitMask(self.ids(['cafe'])).nonzero()[0].tolist(),
+                         [2, 8, 11])
+        self.assertEqual(self.index.HitMask(self.ids(['cafe', 'is'])).nonzero()[0].tolist(),
+                         [11])
+        self.assertEqual(self.index.HitMask(self.ids(['is', 'great', '.', 'x'])).sum(), 0)
+
+    def test_nearest_occurrences(self):
+        positions = list(range(-2, len(self.doc) + 2))
+        for ngram in map(self.ids, [['cafe'], ['this', 'is'], [], ['x']]):
+            for direction in [1, -1]:
+                for window in [-1, 0, 3, 10]:
+                    expected = [self.index.NearestOccurrence(pos, ngram, direction, window)
+                                for pos in positions]
+                    self.assertEqual(self.index.NearestOccurrences(positions, ngram,
+                                                                   direction, window).tolist(),
+                                     expected)
+
+    def test_matches_scan(self):
+        ngrams = [['cafe'], ['this'], ['is'], ['cafe', '.'], ['this', 'cafe', 'is'], ['x']]
+        for ngram in map(self.ids, ngrams):
+            for direction in [1, -1]:
+                for window in [0, 3, 10]:
+                    for pos in range(-2, len(self.doc) + 2):
+                        expected = -1
+                        for distance in range(window + 1):
+                            if self.matcher.MatchesNormalizedNgram(
+                                    pos + direction * distance, ngram, direction):
+                                expected = distance
+                                break
+                        self.assertEqual(
+                            self.index.NearestOccurrence(pos, ngram, direction, window),
+                            expected, (ngram, direction, window, pos))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,122 @@
+'''
+Copyright 2017 Recruit Institute of Technology
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+     http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+'''
+
+import os
+import shutil
+import tempfile
+import unittest
+from koko.entity_classifier import DictionaryRegistry, dictionary_registry
+from koko.entity_extractor import EntityExtractor
+from koko.matcher import Matcher
+from koko.parser import Predicate
+from koko.scorer import Scorer
+from koko.test_document import TestDocument
+
+
+class DictionaryRegistryTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.dict_dir = tempfile.mkdtemp()
+        self.registry = DictionaryRegistry(self.dict_dir)
+        self.Write('Cafe', 'Cafe Benz\nPhilz Coffee\n')
+        self.Write('Drink.txt', 'coffee\ntea\n')
+
+    def tearDown(self):
+        shutil.rmtree(self.dict_dir)
+
+    def Write(self, name, text, mtime=None):
+        path = os.path.join(self.dict_dir, name)
+        with open(path, 'w') as myfile:
+            myfile.write(text)
+        if mtime is not None:
+            os.utime(path, ns=(mtime, mtime))
+
+    def test_lazy_loading(self):
+        self.assertEqual(self.registry.classifiers, {})
+        cafe = self.registry.Get('Cafe')
+        self.assertEqual(cafe.is_entity('Cafe Benz'), 1)
+        self.assertEqual(cafe.is_entity('Cafe'), 0)
+        self.assertEqual(sorted(self.registry.classifiers), ['Cafe'])
+        self.assertIs(self.registry.Get('Cafe'), cafe)
+        self.assertEqual(self.registry.Get('Drink').is_entity('tea'), 1)
+        self.assertIsNone(self.registry.Get('Food'))
+
+    def test_invalidation(self):
+        self.Write('Cafe', 'Cafe Benz\n', mtime=10**18)
+        cafe = self.registry.Get('Cafe')
+        self.assertIs(self.registry.Get('Cafe'), cafe)
+        self.Write('Cafe', 'Blue Bottle\n', mtime=10**18 + 10**9)
+        updated = self.registry.Get('Cafe')
+        self.assertIsNot(updated, cafe)
+        self.assertEqual(updated.is_entity('Blue Bottle'), 1)
+        self.assertEqual(updated.is_entity('Cafe Benz'), 0)
+        os.remove(os.path.join(self.dict_dir, 'Cafe'))
+        self.assertIsNone(self.registry.Get('Cafe'))
+
+    def test_invalid_names(self):
+        inner = os.path.join(self.dict_dir, 'inner')
+        os.mkdir(inner)
+        registry = DictionaryRegistry(inner)
+        self.Write('Secret', 'password\n')
+        for name in ['../Secret', os.path.join(self.dict_dir, 'Secret'), '..', '',
+                     os.path.join('..', 'Cafe')]:
+            self.assertIsNone(registry.Path(name))
+            self.assertIsNone(registry.Get(name))
+        self.assertIsNone(self.registry.Path('/etc/passwd'))
+        doc = TestDocument('Use the password now.')
+        extractor = EntityExtractor(doc, testing=True, dictionaries=registry)
+        self.assertEqual(extractor.GetSpans('Dict(../Secret)'), [])
+
+    def test_scorer(self):
+        doc = TestDocument('I like Cafe Benz and tea.')
+        predicates = [Predicate('dict', 'Cafe'), Predicate('dict', 'Drink')]
+        scorer = Scorer(doc, Matcher(doc), predicates, dictionaries=self.registry)
+        self.assertEqual(self.registry.classifiers, {})
+        self.assertEqual(scorer.DictionaryMatchScore(doc[2:4], 'Cafe'), 1)
+        self.assertEqual(scorer.DictionaryMatchScore(doc[5:6], 'Drink'), 1)
+        self.assertEqual(scorer.DictionaryMatchScore(doc[5:6], 'Food'), 0)
+        other = Scorer(doc, Matcher(doc), predicates, dictionaries=self.registry)
+        self.assertIs(other.GetEntityClassifier('Cafe'), scorer.GetEntityClassifier('Cafe'))
+        self.assertIs(Scorer(doc, Matcher(doc), predicates).dictionaries,
+                      dictionary_registry)
+    def test_find_entries(self):
+        self.Write('City', 'Andorra la Vella\nAndorra\nRas al-Khaimah\nSão Paulo\n\n')
+        doc = TestDocument('From Andorra la Vella to Ras al-Khaimah, '
+                           'then to andorra la vella and Sao Paulo.')
+        matcher = Matcher(doc)
+        city = self.registry.Get('City')
+        expected = [(1, 2), (1, 4), (5, 9), (12, 13), (12, 15), (16, 18)]
+        self.assertEqual(city.FindEntries(matcher.tokens), expected)
+        self.assertEqual(city.FindEntries(matcher.tokens, matcher.index), expected)
+
+    def test_dictionary_spans(self):
+        self.Write('City', 'Andorra la Vella\nAndorra\nRas al-Khaimah\nSão Paulo\n')
+        doc = TestDocument('From Andorra la Vella to Ras al-Khaimah, '
+                           'then to andorra la vella and Sao Paulo.')
+        extractor = EntityExtractor(doc, testing=True, dictionaries=self.registry)
+        self.assertEqual([span.text for span in extractor.GetSpans('Dict(City)')],
+                         ['Andorra', 'Andorra la Vella', 'Ras al-Khaimah'])
+        self.assertEqual([span.text for span in
+                          extractor.GetSpans('Dict(City,normalized)')],
+                         ['Andorra', 'Andorra la Vella', 'Ras al-Khaimah', 'andorra',
+                          'andorra la vella', 'Sao Paulo'])
+        self.assertEqual(extractor.GetSpans('Dict(Food)'), [])
+        entities = extractor.TopEntities('extract "Dict(City)" x from "doc.txt" if '
+                                         '("to" x {1})')
+        self.assertEqual([e.name for e in entities], ['Ras al-Khaimah'])
+
+if __name__ == '__main__':
+    unittest.main()
@@ -18,6 +18,7 @@ limitations under the License.
 
 import unittest
 from koko.entity_extractor import EntityExtractor
+from koko.parser import Parser
 # Dependency injection: use TestDocument instead of the SpaCy document to avoid loading
 # the SpaCy models.
 # Warning: the extracted entities and noun chunks are fake, using simple heuristics.
@@ -137,6 +138,186 @@ class EntityExtractorTestCase(unittest.TestCase):
                        ['figure skating'],
                        [0.99])
 
+    def test_ngram_mentions(self):
+        doc = TestDocument('This is Cafe Benz. I like cafe benz, a lot. Cafe Benz.')
+        extractor = EntityExtractor(doc, testing=True)
+        extractor.ngram_block_size = 4
+        mentions = list(extractor.IterMentions('Ngrams(1,3)'))
+        expected = extractor.JoinSpansAndSentences(extractor.GetSpans('Ngrams(1,3)'))
+        self.assertEqual([(m.span.start, m.span.end, m.sentence_index) for m in mentions],
+                         [(m.span.start, m.span.end, m.sentence_index) for m in expected])
+        extractor.skip_punctuation = True
+        mentions = list(extractor.IterMentions('Ngrams(1,3)'))
+        self.assertEqual(len(mentions), 25)
+        for m in mentions:
+            self.assertTrue(m.span.text[0].isalpha() and m.span.text[-1].isalpha())
+
+    def test_context_candidates(self):
+        doc = TestDocument('Let me introduce Cafe Benz, a full service cafe in the middle '
+                           'of the car dealership. Sit on a soft leather couch in Cafe Benz.')
+        for etype in ['Ngrams(1,3)', 'Ents']:
+            for context in ['("introduce" x {0.5}) or (x near "cafe" {0.5})',
+                            '(x ", a" {0.5}) or (str(x) contains "Cafe" {-0.2})',
+                            '(str(x) contains "Cafe" {0.5})']:
+                query = 'extract "%s" x from "doc.txt" if %s with threshold 0.1' % \
+                    (etype, context)
+                expected = EntityExtractor(doc, testing=True).TopEntities(query)
+                extractor = EntityExtractor(doc, testing=True, context_candidates=True)
+                entities = extractor.TopEntities(query)
+                self.assertEqual([(e.span.text, e.score) for e in entities],
+                                 [(e.span.text, e.score) for e in expected])
+
+    def test_top_k(self):
+        doc = TestDocument('Let me introduce Cafe Benz, a full service cafe in the middle '
+                           'of the car dealership. Sit on a soft leather couch in Cafe Benz. '
+                           'The Cafe Benz serves coffee, the coffee is great.')
+        extractor = EntityExtractor(doc, testing=True)
+        for context in ['("the" near x {0.6}) or (x near "cafe" {0.5})',
+                        '("the" near x {0.6}) or (str(x) contains "Cafe" {-0.2})']:
+            query = 'extract "Ngrams(1,2)" x from "doc.txt" if %s with threshold 0.1' % \
+                context
+            expected = [(e.span.text, e.score) for e in extractor.TopEntities(query)]
+            extractor.mention_batch_size = 4
+            for k in [1, 3, 10]:
+                self.assertEqual([(e.span.text, e.score) for e in extractor.TopK(query, k)],
+                                 expected[:k])
+                entities = extractor.TopEntities(query + ' limit %d' % k)
+                self.assertEqual([(e.span.text, e.score) for e in entities], expected[:k])
+            del extractor.mention_batch_size
+
+    def test_rescore(self):
+        doc = TestDocument('Let me introduce Cafe Benz, a full service cafe in the middle '
+                           'of the car dealership. Sit on a soft leather couch in Cafe Benz. '
+                           'The Cafe Benz serves coffee, the coffee is great.')
+        extractor = EntityExtractor(doc, testing=True)
+        query = 'extract "Ngrams(1,2)" x from "doc.txt" if ("the" near x {%s}) or ' \
+                '(str(x) contains "Cafe" {%s}) with threshold %s'
+        entities = extractor.TopEntities(query % (0.6, 0.5, 0.1))
+        self.assertEqual(entities.score_matrix.scores.shape,
+                         (len(entities.mentions), 2))
+        for weights, threshold, limit in [([0.6, 0.5], 0.1, 0), ([0.2, -0.1], 0.05, 0),
+                                          ([0, 1], 0.5, 0), ([1, 0.2], 0.1, 3)]:
+            expected = extractor.TopEntities(query % (weights[0], weights[1], threshold) +
+                                             (' limit %d' % limit if limit else ''))
+            rescored = entities.Rescore(weights, threshold, limit)
+            self.assertEqual([(e.span.text, e.score, e.scores,
+                               [m.span.start for m in e.mentions]) for e in rescored],
+                             [(e.span.text, e.score, e.scores,
+                               [m.span.start for m in e.mentions]) for e in expected])
+
+    def test_rescore_partial(self):
+        doc = TestDocument('The Cafe Benz serves coffee, the coffee is great. ' * 20)
+        extractor = EntityExtractor(doc, testing=True)
+        extractor.mention_batch_size = 8
+        query = 'extract "Ngrams(1,2)" x from "doc.txt" if ("the" near x {1}) or ' \
+                '(x near "cafe" {0.05})'
+        entities = extractor.TopEntities(query)
+        self.assertFalse(entities.partial)
+        self.assertFalse(entities.Rescore().partial)
+        limited = extractor.TopEntities(query + ' limit 2')
+        self.assertTrue(limited.partial)
+        self.assertLess(len(limited.mentions), len(entities.mentions))
+        self.assertEqual([(e.span.text, e.score) for e in limited],
+                         [(e.span.text, e.score) for e in entities[:2]])
+        with self.assertRaises(AssertionError):
+            limited.Rescore([0.01, 0.01], 0, 0)
+
+    def test_reuse_analysis(self):
+        doc = TestDocument('Let me introduce Cafe Benz, a full service cafe. '
+                           'Sit on a soft leather couch in Cafe Benz.')
+        extractor = EntityExtractor(doc, testing=True)
+        for etype in ['Ents', 'NPs', 'Ngrams(1,2)']:
+            for context in ['("introduce" x {0.5})', '(x ", a" {0.4})',
+                            '(x near "cafe" {0.2})']:
+                query = 'extract "%s" x from "doc.txt" if %s with threshold 0.1' % \
+                    (etype, context)
+                expected = EntityExtractor(doc, testing=True).TopEntities(query)
+                entities = extractor.TopEntities(query)
+                self.assertEqual([(e.span.text, e.score) for e in entities],
+                                 [(e.span.text, e.score) for e in expected])
+        self.assertEqual(sorted(extractor.sentence_spans), ['Ents', 'NPs'])
+        parser = Parser('extract "Ents" x from "doc.txt" if ("introduce" x)')
+        scorer = extractor.GetScorer(parser)
+        self.assertIs(scorer.semantic_scorer, extractor.GetScorer(parser).semantic_scorer)
+
+    def test_top_entities_batch(self):
+        doc = TestDocument('Let me introduce Cafe Benz, a full service cafe in the middle '
+                           'of the car dealership. Sit on a soft leather couch in Cafe Benz. '
+                           'The Cafe Benz serves coffee, the coffee is great.')
+        queries = []
+        for etype in ['Ents', 'Ngrams(1,2)']:
+            for context in ['("introduce" x {0.5}) or (x near "cafe" {0.2})',
+                            '(x near "cafe" {0.3}) or (str(x) contains "Cafe" {-0.1})',
+                            '("the" near x {0.6}) excluding (str(x) contains "Benz")']:
+                queries.append('extract "%s" x from "doc.txt" if %s '
+                               'with threshold 0.1' % (etype, context))
+        queries.append('extract "Ents" x from "doc.txt" if ("introduce" x) limit 1')
+        queries.append('extract x from')
+        extractor = EntityExtractor(doc, testing=True)
+        extractor.mention_batch_size = 4
+        results = extractor.TopEntitiesBatch(queries)
+        self.assertTrue(extractor.error_msg)
+        self.assertEqual(results[-1], [])
+        for query, entities in zip(queries[:-1], results):
+            expected = extractor.TopEntities(query)
+            self.assertEqual([(e.span.text, e.score, e.scores,
+                               [(m.span.start, m.score, m.scores) for m in e.mentions])
+                              for e in entities],
+                             [(e.span.text, e.score, e.scores,
+                               [(m.span.start, m.score, m.scores) for m in e.mentions])
+                              for e in expected])
+
+    def test_iter_top_entities(self):
+        doc = TestDocument('Let me introduce Cafe Benz, a full service cafe in the middle '
+                           'of the car dealership. Sit on a soft leather couch in Cafe Benz. '
+                           'The Cafe Benz serves coffee, the coffee is great. ' * 4)
+        query = 'extract "Ngrams(1,2)" x from "doc.txt" if ("the" near x {0.2}) or ' \
+                '(x near "cafe" {0.1}) with threshold 0.1'
+        extractor = EntityExtractor(doc, testing=True)
+        expected = extractor.TopEntities(query)
+        extractor.mention_batch_size = 4
+        updates = list(extractor.IterTopEntities(query))
+        self.assertEqual([update.final for update in updates],
+                         [False] * (len(updates) - 1) + [True])
+        self.assertGreater(len(updates), 2)
+        self.assertEqual([(e.span.text, e.score) for e in updates[-1].entities],
+                         [(e.span.text, e.score) for e in expected])
+        # Without negative weights, provisional scores only grow up to the final ones.
+        scores = {}
+        final_scores = {e.span.text: e.score for e in expected}
+        for update in updates[:-1]:
+            for entity in update.entities:
+                self.assertEqual(entity.mentions, [])
+                self.assertGreater(entity.score, scores.get(entity.span.text, 0))
+                self.assertLessEqual(entity.score, final_scores[entity.span.text])
+                scores[entity.span.text] = entity.score
+        updates = list(extractor.IterTopEntities('extract x from'))
+        self.assertEqual([(u.entities, u.final) for u in updates], [([], True)])
+
+    def test_compact_entities(self):
+        doc = TestDocument('Let me introduce Cafe Benz, a full service cafe. '
+                           'Sit on a soft leather couch in Cafe Benz.')
+        query = 'extract "Ents" x from "doc.txt" if ("introduce" x {0.5}) or ' \
+                '(x ", a" {0.4}) with threshold 0.5'
+        expected = EntityExtractor(doc, testing=True).TopEntities(query)
+        self.assertEqual(expected[0].mentions[0].scores, [1.0, 1.0])
+        self.assertFalse(hasattr(expected[0], '__dict__'))
+        self.assertFalse(hasattr(expected[0].mentions[0], '__dict__'))
+        entities = EntityExtractor(doc, testing=True, compact=True).TopEntities(query)
+        self.assertEqual([(e.name, e.score, len(e.mentions)) for e in entities],
+                         [(e.name, e.score, len(e.mentions)) for e in expected])
+        self.assertFalse(hasattr(entities[0], 'span'))
+        self.assertFalse(hasattr(entities[0].mentions[0], 'span'))
+        self.assertEqual(entities[0].mentions[0].score, expected[0].mentions[0].score)
+
+    def test_find_all_mentions(self):
+        doc = TestDocument('This is Cafe Benz. I like cafe benz a lot. Cafe Benz.')
+        extractor = EntityExtractor(doc, testing=True)
+        mentions = extractor.FindAllMentions([doc[2:4], doc[6:8], doc[2:3]])
+        self.assertEqual([(m.span.start, m.span.end, m.sentence_index) for m in mentions],
+                         [(2, 3, 0), (2, 4, 0), (6, 8, 1), (7, 8, 1), (7, 9, 1),
+                          (12, 13, 2), (12, 14, 2)])
+
 '''
     def test_ents_etype_context(self):
         self.QueryTest('Let me introduce Cafe Benz, a full service cafe '
@@ -15,7 +15,8 @@ limitations under the License.
 '''
 
 import unittest
-from koko.matcher import Matcher
+from koko.matcher import Matcher, get_token_ids
+from koko.vocabulary import vocabulary
 from koko.test_document import TestDocument  
 
 class MatcherTestCase(unittest.TestCase):
@@ -51,6 +52,24 @@ class MatcherTestCase(unittest.TestCase):
     def test_reverse_match_end(self):
         self.MatchTest('This is Cafe Benz, a full service cafe.', 10, 'cafe .', -1)
 
+    def test_match_ignore_accents(self):
+        self.MatchTest('This is Café Benz, a full service cafe.', 2, 'cafe benz')
+
+    def test_token_ids(self):
+        doc = TestDocument('Café Benz, a CAFE.')
+        token_ids = get_token_ids(doc)
+        self.assertEqual([vocabulary.Word(i) for i in token_ids.tolist()],
+                         ['cafe', 'benz', ',', 'a', 'cafe', '.'])
+        self.assertIs(doc.token_ids, token_ids)
+        self.assertEqual(get_token_ids(doc).dtype, 'int32')
+        self.assertEqual(get_token_ids(doc)[0], get_token_ids(doc)[4])
+        ids = lambda words: [vocabulary.Id(word) for word in words]
+        matcher = Matcher(doc)
+        self.assertTrue(matcher.MatchesNormalizedNgram(5, ids(['a', 'cafe']), -1))
+        self.assertFalse(matcher.MatchesNormalizedNgram(1, ids(['cafe', 'benz']), -1))
+        self.assertFalse(matcher.MatchesNormalizedNgram(5, ids(['.', 'x'])))
+        self.assertEqual(matcher.FindNgram(['A', 'Café']), (3, 5))
+
 if __name__ == '__main__':
     unittest.main()
     
@@ -173,6 +173,26 @@ class ParserTestCase(unittest.TestCase):
             excluding_contexts=[['the'], ['tea'], ['food', 'court']]
         )
 
+    def test_limit(self):
+        parser = Parser('extract "Ents" x from "doc.txt" if ("introducing" x) '
+                        'with threshold 0.8 limit 20', testing=True)
+        self.assertTrue(parser.is_parsed)
+        self.assertEqual(parser.limit, 20)
+        self.assertEqual(parser.threshold, 0.8)
+        self.assertTrue(parser.toString().endswith('limit 20\n'))
+        parser = Parser('extract "Ents" x from "doc.txt" if ("introducing" x) limit x',
+                        testing=True)
+        self.assertFalse(parser.is_parsed)
+
+    def test_predicate_key(self):
+        parser = Parser('extract "Ents" x from "doc.txt" if ("introducing" x {0.5}) or '
+                        '(x near "cafe") or ("introducing" x) or (x near "cafe" {2})',
+                        testing=True)
+        keys = [p.Key() for p in parser.predicates]
+        self.assertEqual(keys[0], keys[2])
+        self.assertEqual(keys[1], keys[3])
+        self.assertNotEqual(keys[0], keys[1])
+
     def test_syntax_error(self):
         parser = Parser(
             'select Ents(x) from "doc.txt" if (x "serves coffee") with threshold 0.8')
@@ -0,0 +1,220 @@
+'''
+Copyright 2017 Recruit Institute of Technology
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+     http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+'''
+
+import json
+import multiprocessing
+import os
+import pickle
+import shutil
+import tempfile
+import time
+import unittest
+from koko.query_processor import CorpusWorker, QueryProcessor, corpus_paths
+from unittest import mock
+try:
+    import jsonpickle
+except ImportError:
+    jsonpickle = None
+
+
+class QueryProcessorTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.root_dir = tempfile.mkdtemp()
+        self.corpus_dir = os.path.join(self.root_dir, 'docs')
+        self.cache_dir = os.path.join(self.root_dir, 'cache')
+        os.makedirs(self.corpus_dir)
+        texts = ['Let me introduce Cafe Benz, a full service cafe.\n',
+                 'We introduce Philz Coffee, a great cafe. I introduce Cafe Benz.\n',
+                 'Nothing to see here.\n']
+        self.paths = []
+        for i, text in enumerate(texts):
+            path = os.path.join(self.corpus_dir, 'doc%d.txt' % i)
+            with open(path, 'w') as myfile:
+                myfile.write(text)
+            self.paths.append(path)
+        self.manifest = os.path.join(self.root_dir, 'docs.manifest')
+        with open(self.manifest, 'w') as manifest:
+            manifest.write('# documents\ndocs/doc2.txt\n\ndocs/doc0.txt\n')
+
+    def tearDown(self):
+        shutil.rmtree(self.root_dir)
+
+    def Query(self, name, limit=0):
+        return 'extract "Ents" x from "%s" if ("introduce" x {0.6}) or ' \
+            '(x ", a" {0.3})%s' % (name, ' limit %d' % limit if limit else '')
+
+    def test_corpus_paths(self):
+        self.assertEqual(corpus_paths(self.corpus_dir), self.paths)
+        self.assertEqual(corpus_paths(os.path.join(self.corpus_dir, 'doc[01].txt')),
+                         self.paths[:2])
+        self.assertEqual(corpus_paths(self.manifest), [self.paths[2], self.paths[0]])
+        self.assertIsNone(corpus_paths(self.paths[0]))
+        # Existing files are single documents, even if their name is a glob pattern.
+        path = os.path.join(self.root_dir, 'data[1].txt')
+        with open(path, 'w') as myfile:
+            myfile.write('Let me introduce Cafe Benz.\n')
+        self.assertIsNone(corpus_paths(path))
+        processor = QueryProcessor(cache_dir=self.cache_dir)
+        self.assertEqual([e.name for e in processor.ProcessQuery(self.Query(path)).entities],
+                         ['Cafe Benz'])
+        # Hidden files and manifests are not documents of a directory.
+        for name in ['.hidden', 'other.manifest']:
+            with open(os.path.join(self.corpus_dir, name), 'w') as myfile:
+                myfile.write('doc0.txt\n')
+        self.assertEqual(corpus_paths(self.corpus_dir), self.paths)
+
+    def test_document_cache(self):
+        query = self.Query(self.paths[0])
+        cwd = os.getcwd()
+        os.chdir(self.root_dir)
+        try:
+            QueryProcessor().ProcessQuery(query, 'I introduce Cafe Benz, a cafe.\n')
+            QueryProcessor().ProcessQuery(query)
+        finally:
+            os.chdir(cwd)
+        self.assertFalse(os.path.exists(self.cache_dir))
+        processor = QueryProcessor(cache_dir=self.cache_dir)
+        processor.ProcessQuery(query, 'I introduce Cafe Benz, a cafe.\n')
+        self.assertFalse(os.path.exists(self.cache_dir))
+        processor.ProcessQuery(query)
+        self.assertEqual(len(os.listdir(self.cache_dir)), 1)
+
+    def test_unreadable_documents(self):
+        with open(os.path.join(self.corpus_dir, 'empty.txt'), 'w'):
+            pass
+        with open(os.path.join(self.corpus_dir, 'image.bin'), 'wb') as myfile:
+            myfile.write(bytes(range(256)) * 4)
+        processor = QueryProcessor(cache_dir=self.cache_dir, max_workers=1)
+        response = processor.ProcessQuery(self.Query(self.corpus_dir))
+        self.assertEqual(len(response.documents), len(self.paths) + 2)
+        self.assertEqual([e.name for e in response.entities], ['Cafe Benz', 'Philz Coffee'])
+
+    def test_corpus_query(self):
+        processor = QueryProcessor(cache_dir=self.cache_dir, max_workers=1)
+        document_entities = {}
+        for path in self.paths:
+            response = processor.ProcessQuery(self.Query(path))
+            document_entities[path] = [(e.name, e.score) for e in response.entities]
+        response = processor.ProcessQuery(self.Query(self.corpus_dir))
+        self.assertEqual(response.documents, self.paths)
+        self.assertEqual(response.document_entities, document_entities)
+        # Ties are ranked by first appearance.
+        self.assertEqual([(e.name, round(e.score, 6)) for e in response.entities],
+                         [('Cafe Benz', 0.9), ('Philz Coffee', 0.9)])
+        self.assertEqual([(path, round(score, 6))
+                          for path, score in response.entities[0].document_scores],
+                         [(self.paths[0], 0.9), (self.paths[1], 0.6)])
+        for aggregation, expected in [('sum', [('Cafe Benz', 1.5), ('Philz Coffee', 0.9)]),
+                                      ('mean', [('Philz Coffee', 0.9), ('Cafe Benz', 0.75)])]:
+            processor = QueryProcessor(cache_dir=self.cache_dir, max_workers=1,
+                                       corpus_aggregation=aggregation)
+            response = processor.ProcessQuery(self.Query(self.corpus_dir))
+            self.assertEqual([(e.name, round(e.score, 6)) for e in response.entities],
+                             expected)
+            response = processor.ProcessQuery(self.Query(self.corpus_dir, limit=1))
+            self.assertEqual([(e.name, round(e.score, 6)) for e in response.entities],
+                             expected[:1])
+
+    def test_normalized_corpus_entities(self):
+        with open(self.paths[2], 'w') as myfile:
+            myfile.write('We introduce Café Benz, a small cafe.\n')
+        processor = QueryProcessor(max_workers=1, corpus_aggregation='sum')
+        response = processor.ProcessQuery(self.Query(self.corpus_dir))
+        self.assertEqual([(name, round(score, 6)) for name, score in
+                          response.document_entities[self.paths[2]]], [('Café Benz', 0.9)])
+        self.assertEqual([(e.name, round(e.score, 6)) for e in response.entities],
+                         [('Cafe Benz', 2.4), ('Philz Coffee', 0.9)])
+        self.assertEqual([path for path, score in response.entities[0].document_scores],
+                         self.paths)
+
+    def test_iter_query(self):
+        processor = QueryProcessor(cache_dir=self.cache_dir, max_workers=1,
+                                   corpus_aggregation='sum')
+        updates = list(processor.IterQuery(self.Query(self.corpus_dir)))
+        response = processor.ProcessQuery(self.Query(self.corpus_dir))
+        self.assertEqual([(u.document, u.document_entities) for u in updates[:-1]],
+                         list(response.document_entities.items()))
+        self.assertEqual([[(name, round(score, 6)) for name, score in u.entities]
+                          for u in updates[:-1]],
+                         [[('Cafe Benz', 0.9)], [('Cafe Benz', 1.5), ('Philz Coffee', 0.9)],
+                          []])
+        self.assertTrue(updates[-1].final)
+        self.assertEqual([e.name for e in updates[-1].entities],
+                         [e.name for e in response.entities])
+        updates = list(processor.IterQuery(self.Query(self.paths[1])))
+        self.assertTrue(updates[-1].final)
+        self.assertIsNone(updates[-1].document)
+        self.assertEqual([e.name for e in updates[-1].entities],
+                         ['Philz Coffee', 'Cafe Benz'])
+
+    def test_worker_processes(self):
+        query = self.Query(os.path.join(self.corpus_dir, '*.txt'))
+        expected = QueryProcessor(cache_dir=self.cache_dir, max_workers=1).ProcessQuery(query)
+        response = QueryProcessor(cache_dir=self.cache_dir, max_workers=2).ProcessQuery(query)
+        self.assertEqual(response.document_entities, expected.document_entities)
+        self.assertEqual([(e.name, e.score) for e in response.entities],
+                         [(e.name, e.score) for e in expected.entities])
+    @unittest.skipIf(multiprocessing.get_start_method() != 'fork',
+                     'workers must inherit the slowed down CorpusWorker')
+    def test_close_stream(self):
+        paths = []
+        for i in range(16):
+            path = os.path.join(self.root_dir, 'slow%d.txt' % i)
+            with open(path, 'w') as myfile:
+                myfile.write('Let me introduce Cafe Benz %d.\n' % i)
+            paths.append(path)
+        process = CorpusWorker.Process
+
+        def SlowProcess(worker, path):
+            time.sleep(0.2)
+            return process(worker, path)
+
+        processor = QueryProcessor(cache_dir=self.cache_dir, max_workers=2)
+        with mock.patch.object(CorpusWorker, 'Process', SlowProcess):
+            updates = processor.IterQuery(self.Query(os.path.join(self.root_dir,
+                                                                  'slow*.txt')))
+            self.assertEqual(next(updates).document, sorted(paths)[0])
+            updates.close()
+        # Only the chunks that were queued are processed; the others are cancelled.
+        self.assertLessEqual(len(os.listdir(self.cache_dir)), len(paths) // 2)
+
+    @unittest.skipIf(jsonpickle is None, 'jsonpickle is not installed')
+    def test_json_response(self):
+        query = self.Query('doc.txt')
+        text = 'Let me introduce Cafe Benz, a full service cafe.\n'
+        for compact in [False, True]:
+            processor = QueryProcessor(cache_dir=self.cache_dir, compact_results=compact)
+            response = processor.ProcessQuery(query, text)
+            encoded = json.loads(jsonpickle.encode(response, unpicklable=False))
+            entities = encoded['entities']
+            self.assertEqual([(e['name'], e['score']) for e in entities],
+                             [(e.name, e.score) for e in response.entities])
+            self.assertNotIn('compact_name', entities[0])
+            self.assertEqual('span' in entities[0], not compact)
+            self.assertEqual(entities[0]['mentions'][0]['score'],
+                             response.entities[0].mentions[0].score)
+            entities = pickle.loads(pickle.dumps(response.entities))
+            self.assertEqual([(e.name, e.score) for e in entities],
+                             [(e.name, e.score) for e in response.entities])
+        # Documents read from files are serialized as their text.
+        response = QueryProcessor().ProcessQuery(self.Query(self.paths[0]))
+        encoded = json.loads(jsonpickle.encode(response, unpicklable=False))
+        self.assertEqual(encoded['document'], text)
+        self.assertEqual([e['name'] for e in encoded['entities']], ['Cafe Benz'])
+
+if __name__ == '__main__':
+    unittest.main()
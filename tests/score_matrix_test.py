@@ -0,0 +1,77 @@
+'''
+Copyright 2017 Recruit Institute of Technology
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+     http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+'''
+
+import numpy
+import unittest
+from koko.score_matrix import ScoreMatrix
+
+
+class ScoreMatrixTestCase(unittest.TestCase):
+
+    def setUp(self):
+        scores = [[1, 0], [0.5, 1], [0, 0], [0.25, 0.5], [1, 1], [0, 1]]
+        excluded = numpy.array([False, False, False, False, True, False])
+        entity_ids = numpy.array([0, 1, 2, 0, 1, 2])
+        self.matrix = ScoreMatrix([0.5, 0.4], scores, excluded, entity_ids, 3)
+
+    def test_mention_scores(self):
+        self.assertEqual(self.matrix.MentionScores().tolist(),
+                         [0.5, 0.25 + 0.4, 0, 0.125 + 0.2, -1, 0.4])
+        self.assertEqual(self.matrix.Retained().tolist(),
+                         [True, True, False, True, False, True])
+        self.assertEqual(self.matrix.Positive([1, -1]).tolist(),
+                         [True, False, False, False, False, False])
+
+    def test_entity_scores(self):
+        self.assertEqual(self.matrix.EntitySums().tolist(),
+                         [[1.25, 0.5], [0.5, 1], [0, 1]])
+        self.assertEqual(self.matrix.EntityScores().tolist(),
+                         [0.625 + 0.2, 0.25 + 0.4, 0.4])
+        self.assertEqual(self.matrix.EntityScores([1, 1]).tolist(), [1, 1, 1])
+        self.assertEqual(self.matrix.FirstPositive().tolist(), [0, 1, 5])
+        self.assertEqual(self.matrix.FirstPositive([1, 0]).tolist(), [0, 1, 6])
+
+    def test_rank(self):
+        ids, totals, sums = self.matrix.Rank()
+        self.assertEqual(ids.tolist(), [0, 1, 2])
+        self.assertEqual(self.matrix.Rank(threshold=0.5)[0].tolist(), [0, 1])
+        self.assertEqual(self.matrix.Rank(limit=1)[0].tolist(), [0])
+        # Ties are won by the entity with the first positive mention.
+        ids, totals, sums = self.matrix.Rank([2, 2])
+        self.assertEqual(ids.tolist(), [0, 1, 2])
+        self.assertEqual(totals.tolist(), [3.5, 3, 2])
+        self.assertEqual(self.matrix.Rank([0, 1])[0].tolist(), [1, 2, 0])
+        self.assertEqual(self.matrix.Rank([1, 0])[0].tolist(), [0, 1])
+
+    def test_leaders_saturated(self):
+        self.assertFalse(self.matrix.LeadersSaturated(1))
+        saturated = ScoreMatrix([2, 2], self.matrix.scores, self.matrix.excluded,
+                                self.matrix.entity_ids, 3)
+        self.assertTrue(saturated.LeadersSaturated(3))
+        self.assertFalse(saturated.LeadersSaturated(4))
+
+    def test_concatenate(self):
+        rows = numpy.array([1, 3])
+        matrix = ScoreMatrix.Concatenate([self.matrix.Select(rows, [0, 1], 2),
+                                          self.matrix.Select(rows, [1, 2], 3)],
+                                         self.matrix.weights, 3)
+        self.assertEqual(matrix.scores.tolist(), [[0.5, 1], [0.25, 0.5]] * 2)
+        self.assertEqual(matrix.entity_ids.tolist(), [0, 1, 1, 2])
+        self.assertEqual(matrix.num_entities, 3)
+        self.assertEqual(len(ScoreMatrix.Concatenate([], [1], 0)), 0)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -115,5 +115,23 @@ class ScorerTestCase(unittest.TestCase):
                               ],
                               3)
 
+    def test_batch_scores(self):
+        doc = TestDocument('This is Cafe Benz, a full service cafe. This cafe is great, '
+                           'this is the best cafe.')
+        matcher = Matcher(doc)
+        linked = Predicate('left', ['this'], 10)
+        linked.next = Predicate('right', ['.'], 10)
+        predicates = [Predicate('left', ['this', 'is'], 3), Predicate('right', ['cafe'], 10),
+                      linked, Predicate('inside', ['cafe'])]
+        excluding = [Predicate('right', ['great'])]
+        scorer = Scorer(doc, matcher, predicates, excluding)
+        mentions = [Mention(doc[i:i + n]) for n in [1, 2] for i in range(len(doc) - n)]
+        scorer.ScoreMentions(mentions)
+        for mention in mentions:
+            expected = Mention(mention.span)
+            scorer.ComputeMentionScore(expected)
+            self.assertEqual(mention.scores, expected.scores)
+            self.assertEqual(mention.score, expected.score)
+
 if __name__ == '__main__':
     unittest.main()
@@ -14,8 +14,16 @@ See the License for the specific language governing permissions and
 limitations under the License.
 '''
 
+import json
+import os
+import pickle
+import tempfile
 import unittest
-from koko.segmenter import Segmenter, SegmentedDocument
+from koko.segmenter import Segmenter, SegmentedDocument, SegmentStore, MappedText
+try:
+    import jsonpickle
+except ImportError:
+    jsonpickle = None
 
 class SegmenterTestCase(unittest.TestCase):
                                    #            1         2
@@ -54,7 +62,82 @@ class SegmenterTestCase(unittest.TestCase):
         self.assertEqual(doc[6].text, '7')
         self.assertEqual(doc[7].text, ':')
         self.assertEqual(doc[8].text, '50')
-        
+
+    def test_segment_store(self):
+        segments = Segmenter.Segment('Hi, there.\nBye')
+        self.assertIsInstance(segments, SegmentStore)
+        self.assertEqual(list(segments.starts), [0, 2, 4, 9, 11])
+        self.assertEqual(list(segments.ends), [2, 3, 9, 10, 14])
+        self.assertEqual(list(segments.rows), [1, 1, 1, 1, 2])
+        self.assertEqual(list(segments.cols), [0, 2, 4, 9, 0])
+        self.assertEqual(list(segments.flags), [0, 1, 0, 1, 0])
+        self.assertEqual(segments[-1].text, 'Bye')
+        self.assertEqual([s.text for s in segments[1:3]], [',', 'there'])
+        self.assertEqual([s.text for s in segments], ['Hi', ',', 'there', '.', 'Bye'])
+        self.assertTrue(segments[1].append_to_previous)
+        with self.assertRaises(IndexError):
+            segments[5]
+
+    def test_segmented_span_view(self):
+        doc = SegmentedDocument('Pi is\n  about 3.14, roughly.')
+        span = doc[2:5]
+        self.assertFalse(hasattr(span, '__dict__'))
+        self.assertEqual(span.text, 'about 3.14,')
+        self.assertEqual((span.row, span.col), (2, 2))
+        self.assertEqual((span.start_char, span.end_char), (8, 19))
+        self.assertEqual([s.text for s in span.segments], ['about', '3.14', ','])
+        self.assertEqual([s.text for s in span], ['about', '3.14', ','])
+        self.assertEqual(span[-1].text, ',')
+        self.assertEqual(span[1:3].text, '3.14,')
+        with self.assertRaises(IndexError):
+            span[3]
+
+    @unittest.skipIf(jsonpickle is None, 'jsonpickle is not installed')
+    def test_segmented_span_json(self):
+        doc = SegmentedDocument('Pi is\n  about 3.14, roughly.')
+        encoded = json.loads(jsonpickle.encode(doc[2:5], unpicklable=False))
+        self.assertEqual(encoded['text'], 'about 3.14,')
+        self.assertEqual((encoded['start'], encoded['end']), (2, 5))
+        self.assertEqual((encoded['row'], encoded['col']), (2, 2))
+        self.assertEqual((encoded['start_char'], encoded['end_char']), (8, 19))
+        self.assertEqual([s['text'] for s in encoded['segments']], ['about', '3.14', ','])
+        span = pickle.loads(pickle.dumps(doc[2:5]))
+        self.assertEqual((span.start, span.end, span.text), (2, 5, 'about 3.14,'))
+
+    def test_mapped_text(self):
+        text = 'Café Müller opened in 1998.\nIt serves “crème brûlée”, 3,50 €.\n'
+        with tempfile.NamedTemporaryFile(delete=False) as myfile:
+            myfile.write(text.encode('utf-8'))
+        try:
+            mapped = MappedText(myfile.name)
+            segments = Segmenter.SegmentMapped(mapped, block_size=8)
+            expected = Segmenter.Segment(text)
+            self.assertEqual([s.text for s in segments], [s.text for s in expected])
+            self.assertEqual(list(segments.rows), list(expected.rows))
+            self.assertEqual(list(segments.cols), list(expected.cols))
+            self.assertEqual(list(segments.flags), list(expected.flags))
+            self.assertEqual(segments.ends[-1], len(text.encode('utf-8')) - 1)
+            doc = SegmentedDocument(mapped)
+            self.assertEqual(doc[6:12].text, 'It serves “crème brûlée”')
+        finally:
+            os.unlink(myfile.name)
+
+    def test_engines_are_equivalent(self):
+        texts = ['extract x from "doc.txt" if\n  (str(x) contains "cafe")\n',
+                 'Pi=3.14',
+                 'I woke up this morning at 7:50 am and drove 3.14 miles to work.',
+                 'Hi, there.\nBye',
+                 'He said “1,000.5” dollars…\r\nthat’s ²3.4 and 5.,6 or .7\x1cend\n\n',
+                 '',
+                 '   ']
+        for text in texts:
+            expected = Segmenter.Segment(text, engine='characters')
+            actual = Segmenter.Segment(text, engine='vectorized')
+            for column in ['starts', 'ends', 'rows', 'cols', 'flags']:
+                self.assertEqual(list(getattr(actual, column)),
+                                 list(getattr(expected, column)),
+                                 '%s of %r' % (column, text))
+
             
 if __name__ == '__main__':
     unittest.main()
@@ -0,0 +1,61 @@
+'''
+Copyright 2017 Recruit Institute of Technology
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+     http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+'''
+
+import numpy
+import unittest
+from koko.koko_document import KokoDocument
+from koko.sentence_table import get_sentence_table
+from koko.test_document import TestDocument
+
+
+class SentenceTableTestCase(unittest.TestCase):
+
+    def setUp(self):
+        #                        0    1  2    34 5 6    78 9    10
+        self.doc = TestDocument('This is Cafe Benz. I like it. Cafe Benz')
+        self.table = get_sentence_table(self.doc)
+
+    def test_sentence_of(self):
+        self.assertEqual([self.table.SentenceOf(pos) for pos in range(-1, 12)],
+                         [-1, 0, 0, 0, 0, 0, 1, 1, 1, 1, 2, 2, -1])
+        self.assertIs(get_sentence_table(self.doc), self.table)
+
+    def test_span_sentence(self):
+        for start in range(len(self.doc) + 1):
+            for end in range(start, len(self.doc) + 1):
+                expected = -1
+                for si, sent in enumerate(self.doc.sents):
+                    if start >= sent.start and end <= sent.end:
+                        expected = si
+                        break
+                self.assertEqual(self.table.SpanSentence(start, end), expected,
+                                 (start, end))
+
+    def test_join_spans(self):
+        starts = numpy.array([0, 2, 3, 5, 6, 8, 10])
+        ends = numpy.array([2, 4, 6, 6, 9, 10, 11])
+        self.assertEqual(self.table.JoinSpans(starts, ends).tolist(),
+                         [0, 0, -1, 1, 1, -1, 2])
+
+    def test_span_list_sentences(self):
+        doc = KokoDocument('This is Cafe Benz.\nI like it')
+        table = get_sentence_table(doc)
+        self.assertEqual(table.token_sentences.tolist(), [0, 0, 0, 0, 0, 1, 1, 1])
+        self.assertEqual(table.Sentence(1).text, 'I like it')
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,65 @@
+'''
+Copyright 2017 Recruit Institute of Technology
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+     http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+'''
+
+import random
+import unittest
+from koko.suffix_array import SuffixArray
+from koko.vocabulary import vocabulary
+
+
+class SuffixArrayTestCase(unittest.TestCase):
+
+    def test_sorted_suffixes(self):
+        rng = random.Random(3)
+        for length in [0, 1, 2, 17, 300]:
+            tokens = [rng.choice('abc') for i in range(length)]
+            suffix_array = SuffixArray(vocabulary.TokenIds(tokens))
+            ids = suffix_array.token_ids.tolist()
+            expected = sorted(range(length), key=lambda i: ids[i:])
+            self.assertEqual(suffix_array.sa.tolist(), expected)
+            for i in range(length - 1):
+                a, b = ids[expected[i]:], ids[expected[i + 1]:]
+                lcp = 0
+                while lcp < min(len(a), len(b)) and a[lcp] == b[lcp]:
+                    lcp += 1
+                self.assertEqual(suffix_array.lcp[i], lcp)
+
+    def test_occurrences(self):
+        tokens = 'the cafe is a cafe . the cafe is great'.split()
+        suffix_array = SuffixArray(vocabulary.TokenIds(tokens))
+        ids = lambda words: [vocabulary.Id(word) for word in words]
+        self.assertEqual(suffix_array.Occurrences(ids(['cafe'])), [1, 4, 7])
+        self.assertEqual(suffix_array.Occurrences(ids(['the', 'cafe', 'is'])), [0, 6])
+        self.assertEqual(suffix_array.Occurrences(ids(['cafe', 'cafe'])), [])
+        self.assertEqual(suffix_array.Occurrences(ids(['bistro'])), [])
+        self.assertEqual(suffix_array.OccurrencesAt(6, 2), [0, 6])
+        self.assertEqual(suffix_array.OccurrencesAt(4, 1), [1, 4, 7])
+        self.assertEqual(suffix_array.OccurrencesAt(3, 2), [3])
+
+    def test_repeated_text(self):
+        tokens = ('a b a b c ' * 40).split()
+        suffix_array = SuffixArray(vocabulary.TokenIds(tokens))
+        for pos in range(len(tokens)):
+            for m in [1, 3, 7]:
+                if pos + m > len(tokens):
+                    continue
+                expected = [i for i in range(len(tokens) - m + 1)
+                            if tokens[i:i + m] == tokens[pos:pos + m]]
+                self.assertEqual(suffix_array.OccurrencesAt(pos, m), expected)
+
+
+if __name__ == '__main__':
+    unittest.main()